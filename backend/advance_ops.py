@@ -0,0 +1,138 @@
+# advance_ops.py
+import time
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import and_, func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from ledger import refresh_checkpoints
+from models import AdvanceAccount, AdvanceTxn, AdvanceType
+from periods import closed_yms
+
+# Accounts per multi-row insert / commit in the monthly run
+DEDUCTION_CHUNK = 500
+AUTO_DEDUCTION_NOTE = "Auto monthly deduction"
+
+
+# Concurrency: every advance mutation first takes the account row with
+# SELECT ... FOR UPDATE, so writers for the same employee (clerks on different
+# workers, or a clerk and the monthly run) queue up and read the balance and
+# the month's PAYMENT only once the previous writer has committed. Lock the
+# account before any other read in the transaction: under REPEATABLE READ a
+# plain read taken earlier would pin an older snapshot. The unique key on
+# (emp_no, payment_ym) is the backstop for one PAYMENT per month.
+
+
+def lock_account(db: Session, emp_no: str) -> Optional[AdvanceAccount]:
+    return (
+        db.query(AdvanceAccount)
+        .filter_by(emp_no=emp_no)
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+
+
+def lock_or_create_account(db: Session, emp_no: str, monthly_installment) -> AdvanceAccount:
+    """
+    Locked account row, inserting it first if missing. Two requests creating
+    the same account race on the primary key; the loser takes the winner's row.
+    """
+    acc = lock_account(db, emp_no)
+    if acc:
+        return acc
+    try:
+        with db.begin_nested():
+            db.add(AdvanceAccount(emp_no=emp_no, advance=0, monthly_installment=monthly_installment))
+    except IntegrityError:
+        pass
+    return lock_account(db, emp_no)
+
+
+def _due_query(db: Session, ym: str, emp_nos: Optional[Iterable[str]] = None):
+    """
+    (emp_no, LEAST(balance, installment)) for accounts with a positive balance
+    and installment and no PAYMENT row for ym: one anti-join.
+    """
+    paid = aliased(AdvanceTxn)
+    q = (
+        db.query(
+            AdvanceAccount.emp_no,
+            func.least(AdvanceAccount.advance, AdvanceAccount.monthly_installment).label("amount"),
+        )
+        .outerjoin(paid, and_(
+            paid.emp_no == AdvanceAccount.emp_no,
+            paid.ym == ym,
+            paid.type == AdvanceType.PAYMENT,
+        ))
+        .filter(AdvanceAccount.advance > 0, AdvanceAccount.monthly_installment > 0)
+        .filter(paid.id.is_(None))
+    )
+    if emp_nos is not None:
+        q = q.filter(AdvanceAccount.emp_no.in_(list(emp_nos)))
+    return q.order_by(AdvanceAccount.emp_no)
+
+
+def insert_month_payments(db: Session, ym: str, ts: date, emp_nos: Iterable[str],
+                          note: str = AUTO_DEDUCTION_NOTE) -> Tuple[int, Decimal]:
+    """
+    One multi-row insert of this month's PAYMENT for those of emp_nos still
+    due, inside the caller's transaction. Locks the accounts, then re-checks
+    the anti-join, so running it again (or concurrently) for the same month
+    inserts nothing. Returns (rows, total deducted).
+    """
+    emp_nos = sorted(set(emp_nos))
+    # Same lock order everywhere (emp_no) so concurrent chunks cannot deadlock
+    db.query(AdvanceAccount.emp_no).filter(AdvanceAccount.emp_no.in_(emp_nos)) \
+        .order_by(AdvanceAccount.emp_no).with_for_update().all()
+    due = _due_query(db, ym, emp_nos).all()
+    if not due:
+        return 0, Decimal("0")
+    db.execute(insert(AdvanceTxn), [
+        {"emp_no": emp_no, "ts": ts, "type": AdvanceType.PAYMENT, "amount": -Decimal(str(amount)), "note": note}
+        for emp_no, amount in due
+    ])
+    # Core inserts bypass the ORM flush hook
+    refresh_checkpoints(db, [(emp_no, ym) for emp_no, _ in due])
+    return len(due), sum((Decimal(str(amount)) for _, amount in due), Decimal("0"))
+
+
+def run_auto_deductions(db: Session, ts: date, chunk_size: int = DEDUCTION_CHUNK) -> dict:
+    """
+    The monthly run: find every account due for ts's month, then insert and
+    commit chunk by chunk. A failed chunk is rolled back and reported; the
+    others stand, and a re-run only picks up what is still due.
+    """
+    started = time.perf_counter()
+    ym = ts.strftime("%Y-%m")
+    report = {
+        "ym": ym, "accounts_due": 0, "inserted": 0, "amount_total": 0.0,
+        "chunks": 0, "failed_chunks": 0, "errors": [], "duration_ms": 0.0,
+    }
+    if closed_yms(db, [ym]):
+        report["errors"].append(f"Payroll period {ym} is closed")
+        return report
+
+    due: List[str] = [emp_no for emp_no, _ in _due_query(db, ym).all()]
+    report["accounts_due"] = len(due)
+    # End the read snapshot; each chunk locks its accounts before reading
+    db.rollback()
+    total = Decimal("0")
+    for i in range(0, len(due), chunk_size):
+        chunk = due[i:i + chunk_size]
+        report["chunks"] += 1
+        try:
+            inserted, amount = insert_month_payments(db, ym, ts, chunk)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            report["failed_chunks"] += 1
+            report["errors"].append(f"{chunk[0]}..{chunk[-1]}: {e}")
+            continue
+        report["inserted"] += inserted
+        total += amount
+
+    report["amount_total"] = float(total)
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
@@ -0,0 +1,169 @@
+# attendance_ops.py
+from datetime import date
+from typing import Iterable, List, Tuple
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import Session
+from models import Attendance, DailyHours
+from periods import closed_yms, ym_of
+from report_cache import touch_attendance_dates
+
+# Rows per INSERT statement; keeps statements well under max_allowed_packet
+UPSERT_CHUNK = 1000
+
+
+def _upsert_statement(rows: list):
+    stmt = insert(Attendance).values(rows)
+    return stmt.on_duplicate_key_update(
+        status=stmt.inserted.status,
+        notes=stmt.inserted.notes,
+        updated_at=func.now(),
+    )
+
+
+def upsert_attendance(db: Session, records: Iterable[Tuple[str, date, str, str]]) -> int:
+    """
+    Insert-or-update (emp_no, att_date, status, notes) records with one
+    multi-row upsert per UPSERT_CHUNK rows, inside the caller's transaction.
+    A later record for the same (emp_no, att_date) wins. Returns the row count.
+    """
+    latest = {}
+    for emp_no, att_date, status, notes in records:
+        latest[(emp_no, att_date)] = {"emp_no": emp_no, "att_date": att_date, "status": status, "notes": notes or ""}
+    rows = list(latest.values())
+
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        db.execute(_upsert_statement(rows[i:i + UPSERT_CHUNK]))
+
+    touch_attendance_dates(db, {r["att_date"] for r in rows})
+    return len(rows)
+
+
+# Month grid: one character per day per employee, indexing into the legend.
+# '0' (legend "") means no record for that day.
+GRID_CODES = "0123456789abcdefghijklmnopqrstuvwxyz"
+GRID_LEGEND = ["", "P", "A", "AL", "EL", "ML"]
+
+
+def attendance_grid(db: Session, emp_nos: List[str], start: date, end: date) -> dict:
+    legend = list(GRID_LEGEND)
+    index = {s: i for i, s in enumerate(legend)}
+    n_days = (end - start).days + 1
+    cells = {e: bytearray(b"0" * n_days) for e in emp_nos}
+
+    for emp_no, att_date, status in (
+        db.query(Attendance.emp_no, Attendance.att_date, Attendance.status)
+        .filter(Attendance.att_date >= start, Attendance.att_date <= end)
+    ):
+        row = cells.get(emp_no)
+        if row is None:
+            continue
+        status = (status or "").strip().upper()
+        if status not in index:
+            index[status] = len(legend)
+            legend.append(status)
+        row[(att_date - start).days] = ord(GRID_CODES[index[status]])
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": n_days,
+        "codes": GRID_CODES[:len(legend)],
+        "legend": legend,
+        "rows": {e: row.decode() for e, row in cells.items()},
+    }
+
+
+def attendance_status_counts(db: Session, emp_nos: List[str], start: date, end: date) -> dict:
+    """
+    {emp_no: {status: days}} over start..end, grouped in the database.
+    """
+    status = func.upper(func.trim(Attendance.status))
+    counts = {e: {} for e in emp_nos}
+    for emp_no, st, n in (
+        db.query(Attendance.emp_no, status, func.count())
+        .filter(Attendance.att_date >= start, Attendance.att_date <= end)
+        .group_by(Attendance.emp_no, status)
+    ):
+        if emp_no in counts:
+            counts[emp_no][st] = n
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "statuses": sorted({st for c in counts.values() for st in c}),
+        "rows": [
+            {
+                "emp_no": e,
+                "counts": c,
+                "recorded": sum(c.values()),
+                "absent": sum(n for st, n in c.items() if st != "P"),
+            }
+            for e, c in counts.items()
+        ],
+    }
+
+
+def reconcile_attendance(db: Session, start: date, end: date) -> dict:
+    """
+    Attendance vs logged hours over start..end, in two anti-join queries
+    against the daily_hours rollup:
+      - hours_without_attendance: hours logged, no attendance row
+      - absent_with_hours: hours logged, attendance says other than P
+      - present_without_hours: marked P, no hours logged
+    """
+    status = func.upper(func.trim(Attendance.status))
+    hours = (
+        db.query(DailyHours.emp_no, DailyHours.date, func.sum(DailyHours.hours).label("hours"))
+        .filter(DailyHours.date >= start, DailyHours.date <= end)
+        .group_by(DailyHours.emp_no, DailyHours.date)
+        .having(func.sum(DailyHours.hours) > 0)
+        .subquery()
+    )
+
+    unmarked, absent = [], []
+    for emp_no, d, hrs, st in (
+        db.query(hours.c.emp_no, hours.c.date, hours.c.hours, status)
+        .outerjoin(Attendance, and_(Attendance.emp_no == hours.c.emp_no, Attendance.att_date == hours.c.date))
+        .filter(or_(Attendance.emp_no.is_(None), status != "P"))
+        .order_by(hours.c.emp_no, hours.c.date)
+    ):
+        row = {"emp_no": emp_no, "date": d.isoformat(), "hours": float(hrs)}
+        if st is None:
+            unmarked.append(row)
+        else:
+            absent.append({**row, "status": st})
+
+    present = [
+        {"emp_no": emp_no, "date": d.isoformat()}
+        for emp_no, d in (
+            db.query(Attendance.emp_no, Attendance.att_date)
+            .outerjoin(hours, and_(hours.c.emp_no == Attendance.emp_no, hours.c.date == Attendance.att_date))
+            .filter(Attendance.att_date >= start, Attendance.att_date <= end)
+            .filter(status == "P", hours.c.emp_no.is_(None))
+            .order_by(Attendance.emp_no, Attendance.att_date)
+        )
+    ]
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "hours_without_attendance": unmarked,
+        "absent_with_hours": absent,
+        "present_without_hours": present,
+    }
+
+
+def mark_present(db: Session, report: dict, overwrite_absent: bool = False) -> dict:
+    """
+    Upsert P for the report's logged-but-unmarked days (and, if asked, the
+    logged days marked absent). Days in closed payroll months are skipped.
+    """
+    candidates = list(report["hours_without_attendance"])
+    if overwrite_absent:
+        candidates += report["absent_with_hours"]
+    days = [(r["emp_no"], date.fromisoformat(r["date"])) for r in candidates]
+    closed = closed_yms(db, {ym_of(d) for _, d in days})
+    writable = [(e, d) for e, d in days if ym_of(d) not in closed]
+    marked = upsert_attendance(db, [(e, d, "P", "Auto-marked from timesheet") for e, d in writable])
+    return {"marked": marked, "skipped_closed": len(days) - len(writable)}
@@ -0,0 +1,81 @@
+# bench_payroll.py
+"""
+Benchmark: payroll_kernel vs the per-cell Python loop it replaced.
+
+    python bench_payroll.py [employees] [days]
+
+Defaults to 500 employees x 365 days. No database needed.
+"""
+import sys
+import time
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+import numpy as np
+from payroll import payroll_kernel
+
+
+def legacy_loop(per_emp_day, emp_info):
+    # The former job_hours_by_job rollup: strptime per cell, float accumulation
+    per_emp = {}
+    for (emp_no, date_str), hrs in per_emp_day.items():
+        info = emp_info[emp_no]
+        rec = per_emp.setdefault(emp_no, {
+            "base_pay": info["base_pay"], "ot_flag": info["ot_flag"],
+            "total_hours": 0.0, "reg_hours": 0.0, "not_hours": 0.0, "hot_hours": 0.0, "reg_value": 0.0,
+        })
+        rec["total_hours"] += hrs
+        dt = datetime.strptime(date_str, "%Y-%m-%d")
+        if dt.weekday() == 6:
+            hot, not_, reg = hrs, 0.0, 0.0
+        else:
+            hot = 0.0
+            not_ = max(0.0, hrs - 8.0)
+            reg = max(0.0, hrs - not_)
+        rec["hot_hours"] += hot
+        rec["not_hours"] += not_
+        rec["reg_hours"] += reg
+        dim = monthrange(dt.year, dt.month)[1]
+        rec["reg_value"] += (reg / 8.0) * (rec["base_pay"] / dim)
+    for rec in per_emp.values():
+        hourly = rec["base_pay"] / 240.0 if rec["base_pay"] else 0.0
+        rec["ot_value"] = (
+            rec["not_hours"] * hourly * 1.25 + rec["hot_hours"] * hourly * 1.5
+            if rec["ot_flag"] == "YES" else 0.0
+        )
+        rec["total_value"] = rec["reg_value"] + rec["ot_value"]
+    return per_emp
+
+
+def main(n_emp=500, n_days=365):
+    rng = np.random.default_rng(42)
+    start = date(2025, 1, 1)
+    hours = np.round(rng.uniform(0, 12, size=(n_emp, n_days)), 2)
+    base_pay = rng.uniform(1500, 6000, size=n_emp).round(2)
+    ot_yes = rng.random(n_emp) < 0.7
+
+    emp_nos = [f"E{i}" for i in range(n_emp)]
+    date_strs = [(start + timedelta(days=j)).isoformat() for j in range(n_days)]
+    per_emp_day = {(emp_nos[i], date_strs[j]): float(hours[i, j]) for i in range(n_emp) for j in range(n_days)}
+    emp_info = {e: {"base_pay": float(base_pay[i]), "ot_flag": "YES" if ot_yes[i] else "NO"} for i, e in enumerate(emp_nos)}
+
+    t0 = time.perf_counter()
+    legacy = legacy_loop(per_emp_day, emp_info)
+    t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    out = payroll_kernel(hours, start, base_pay, ot_yes)
+    t_kernel = time.perf_counter() - t0
+
+    for k in ("total_hours", "not_hours", "hot_hours", "reg_value", "ot_value", "total_value"):
+        expected = np.array([legacy[e][k] for e in emp_nos])
+        assert np.allclose(out[k], expected), k
+
+    cells = n_emp * n_days
+    print(f"{n_emp} employees x {n_days} days = {cells} cells")
+    print(f"  python loop : {t_legacy * 1000:9.1f} ms")
+    print(f"  numpy kernel: {t_kernel * 1000:9.1f} ms")
+    print(f"  speedup     : {t_legacy / t_kernel:9.1f}x (results match)")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
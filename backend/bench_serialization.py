@@ -0,0 +1,82 @@
+# bench_serialization.py
+"""
+Benchmark: FastAPI's response_model path vs the fast_json paths for a large
+list of timesheet entries.
+
+    python bench_serialization.py [rows]
+
+Defaults to 50000 rows. No database needed; rows are the tuples a column query returns.
+"""
+import asyncio
+import json
+import sys
+import time
+from datetime import time as dtime
+from decimal import Decimal
+from typing import List
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import TypeAdapter
+from fast_json import dumps, row_dicts
+from schemas import TimesheetEntryOut
+
+FIELDS = ["id", "employee_emp_no", "employee_name", "trade_id", "trade_name",
+          "from_time", "to_time", "break_minutes", "total_hours", "remarks"]
+
+
+def make_rows(n):
+    return [
+        (i, f"E{i % 500}", f"Emp {i % 500}", i % 7 or None, "Fitter" if i % 7 else "N/A",
+         dtime(8, 0), dtime(17, 30), 30, Decimal("9.00"), "")
+        for i in range(n)
+    ]
+
+
+def current_path(rows):
+    # Hand-built TimesheetEntryOut per row, then response_model validation,
+    # serialization and JSONResponse's json.dumps
+    objs = [TimesheetEntryOut(**dict(zip(FIELDS, r))) for r in rows]
+    field = create_model_field(name="Response", type_=List[TimesheetEntryOut], mode="serialization")
+    content = asyncio.run(serialize_response(field=field, response_content=objs, is_coroutine=False))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+# Built once, outside the timed path
+ENTRY_LIST = TypeAdapter(List[TimesheetEntryOut])
+
+
+def adapter_path(rows):
+    return ENTRY_LIST.dump_json(ENTRY_LIST.validate_python(row_dicts(FIELDS, rows)))
+
+
+def direct_path(rows):
+    return dumps(row_dicts(FIELDS, rows, floats=["total_hours"]))
+
+
+def timed(fn, rows):
+    t0 = time.perf_counter()
+    body = fn(rows)
+    return body, time.perf_counter() - t0
+
+
+def main(n=50000):
+    rows = make_rows(n)
+    results = [(name, *timed(fn, rows)) for name, fn in (
+        ("response_model + json.dumps", current_path),
+        ("prebuilt TypeAdapter", adapter_path),
+        ("row dicts + orjson", direct_path),
+    )]
+
+    expected = json.loads(results[0][1])
+    for name, body, _ in results[1:]:
+        assert json.loads(body) == expected, name
+
+    base = results[0][2]
+    print(f"{n} timesheet entry rows ({len(results[0][1]) / 1e6:.1f} MB of JSON)")
+    for name, _, t in results:
+        print(f"  {name:28}: {t * 1000:8.1f} ms  ({base / t:5.1f}x)")
+    print("  (bodies match)")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,233 @@
+# bulk_import.py
+import csv
+import io
+import json
+from datetime import timedelta
+from itertools import islice
+from typing import IO, Iterator, List, Tuple
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from models import Timesheet
+from periods import closed_yms, ym_of
+from rollup import refresh_daily_hours
+from schemas import TimesheetImportRow
+from timesheet_ops import (
+    add_day_hours, existing_emp_nos, existing_trade_ids, load_day_totals,
+    split_entry, bulk_insert_entries,
+)
+
+CHUNK_SIZE = 1000
+
+HEADER_FIELDS = ("date", "job_no", "ship", "site", "sheet_no", "checked_by", "authorized_by", "for_company")
+
+
+def _clean(raw: dict) -> dict:
+    # Spreadsheet cells come in as strings; empty cells mean "use the default"
+    out = {}
+    for k, v in raw.items():
+        if k is None:
+            continue
+        if isinstance(v, str):
+            v = v.strip()
+            if v == "":
+                continue
+        if v is None:
+            continue
+        out[k.strip()] = v
+    return out
+
+
+def _decoded_lines(stream: IO[bytes], bad_lines: set) -> Iterator[str]:
+    # Decode line by line so one bad byte sequence is reported against its
+    # line instead of aborting the whole upload
+    for line_no, raw in enumerate(stream, start=1):
+        try:
+            yield raw.decode("utf-8-sig" if line_no == 1 else "utf-8")
+        except UnicodeDecodeError:
+            bad_lines.add(line_no)
+            yield raw.decode("utf-8", errors="replace")
+
+
+def iter_csv_rows(stream: IO[bytes]) -> Iterator[Tuple[int, dict]]:
+    """
+    Yields (line_no, row) from a CSV upload with a header line, one row at a time.
+    """
+    bad_lines = set()
+    reader = csv.DictReader(_decoded_lines(stream, bad_lines))
+    last_line = reader.line_num
+    for row in reader:
+        # A quoted field can span lines; the row covers all of them
+        if any(n in bad_lines for n in range(last_line + 1, reader.line_num + 1)):
+            yield reader.line_num, {"__error__": "Invalid UTF-8 text"}
+        else:
+            yield reader.line_num, row
+        last_line = reader.line_num
+
+
+def iter_ndjson_rows(stream: IO[bytes]) -> Iterator[Tuple[int, dict]]:
+    """
+    Yields (line_no, row) from an NDJSON upload. A line is either one flat
+    entry row, or a whole sheet (TimesheetIn shape) which is expanded into
+    one row per entry.
+    """
+    bad_lines = set()
+    for line_no, line in enumerate(_decoded_lines(stream, bad_lines), start=1):
+        if line_no in bad_lines:
+            yield line_no, {"__error__": "Invalid UTF-8 text"}
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield line_no, {"__error__": f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(obj, dict):
+            yield line_no, {"__error__": "Expected a JSON object"}
+            continue
+        if "entries" in obj:
+            entries = obj.get("entries") or []
+            if not isinstance(entries, list):
+                yield line_no, {"__error__": "entries: expected a list of objects"}
+                continue
+            header = {k: v for k, v in obj.items() if k != "entries"}
+            for entry in entries:
+                if isinstance(entry, dict):
+                    yield line_no, {**header, **entry}
+                else:
+                    yield line_no, {"__error__": "entries: expected a list of objects"}
+        else:
+            yield line_no, obj
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+    )
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows_read = 0
+        self.entries_inserted = 0
+        self.timesheets_created = 0
+        self.errors: List[dict] = []
+
+    def error(self, row: int, detail: str):
+        self.errors.append({"row": row, "detail": detail})
+
+
+class TimesheetImporter:
+    """
+    Validates and writes imported rows chunk by chunk inside the caller's
+    transaction. Per chunk: one employee query, one trade query, one grouped
+    day-totals query, header inserts for new sheets, and one multi-row entry insert.
+    """
+
+    def __init__(self, db: Session, chunk_size: int = CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.sheet_ids = {}  # header key -> timesheet id
+        self.report = ImportReport()
+
+    def run(self, rows: Iterator[Tuple[int, dict]]) -> ImportReport:
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.report.rows_read += len(chunk)
+            self._process_chunk(chunk)
+        self.report.errors.sort(key=lambda e: e["row"])
+        return self.report
+
+    def _process_chunk(self, chunk: List[Tuple[int, dict]]):
+        report = self.report
+
+        # 1. Shape validation
+        parsed = []
+        for line_no, raw in chunk:
+            if "__error__" in raw:
+                report.error(line_no, raw["__error__"])
+                continue
+            try:
+                parsed.append((line_no, TimesheetImportRow(**_clean(raw))))
+            except ValidationError as e:
+                report.error(line_no, _validation_message(e))
+
+        # 2. Reference validation, one query per table
+        names = existing_emp_nos(self.db, {r.employee_emp_no for _, r in parsed})
+        trades = existing_trade_ids(self.db, {r.trade_id for _, r in parsed})
+
+        # 3. Expand rows into per-sheet fragments, splitting overnight shifts
+        fragments = []  # (line_no, [(header key, entry fields), ...])
+        for line_no, row in parsed:
+            if row.employee_emp_no not in names:
+                report.error(line_no, f"Unknown emp_no: {row.employee_emp_no}")
+                continue
+            if row.trade_id is not None and row.trade_id not in trades:
+                report.error(line_no, f"Unknown trade_id: {row.trade_id}")
+                continue
+
+            key = tuple(getattr(row, f) for f in HEADER_FIELDS)
+            # Part 2 fragments share one next-day sheet per source sheet
+            fragments.append((line_no, [
+                ((key[0] + timedelta(days=offset),) + key[1:], f)
+                for offset, f in split_entry(row, row.sheet_no)
+            ]))
+
+        # 4. Closed payroll months, then the 24h rule against the DB (including earlier chunks) and this chunk
+        closed = closed_yms(self.db, {ym_of(key[0]) for _, parts in fragments for key, _ in parts})
+        totals = load_day_totals(
+            self.db,
+            {(key[0], f["employee_emp_no"]) for _, parts in fragments for key, f in parts},
+        )
+        accepted = []
+        for line_no, parts in fragments:
+            locked = sorted({ym_of(key[0]) for key, _ in parts} & closed)
+            if locked:
+                report.error(line_no, f"Payroll period {locked[0]} is closed")
+                continue
+            over = add_day_hours(totals, [(key[0], f["employee_emp_no"], f["total_hours"]) for key, f in parts])
+            if over:
+                report.error(
+                    line_no,
+                    f"Total hours for employee {over[1]} ({names[over[1]]}) on {over[0]} exceed 24 hours."
+                )
+                continue
+            accepted.extend(parts)
+
+        if not accepted:
+            return
+
+        # 5. Headers for sheets not seen earlier in this import
+        new_sheets = {}
+        for key, _ in accepted:
+            if key not in self.sheet_ids and key not in new_sheets:
+                new_sheets[key] = Timesheet(**dict(zip(HEADER_FIELDS, key)))
+        if new_sheets:
+            self.db.add_all(new_sheets.values())
+            self.db.flush()
+            for key, ts in new_sheets.items():
+                self.sheet_ids[key] = ts.id
+            report.timesheets_created += len(new_sheets)
+
+        # 6. One multi-row insert for the chunk's entries
+        rows = [{**f, "timesheet_id": self.sheet_ids[key]} for key, f in accepted]
+        report.entries_inserted += bulk_insert_entries(self.db, rows)
+        refresh_daily_hours(self.db, {(f["employee_emp_no"], key[0], key[1]) for key, f in accepted})
+
+
+def detect_format(filename: str, content_type: str) -> str:
+    name = (filename or "").lower()
+    ctype = (content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in ctype or "jsonl" in ctype:
+        return "ndjson"
+    return "csv"
+
+
+def iter_upload_rows(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, dict]]:
+    if fmt == "ndjson":
+        return iter_ndjson_rows(stream)
+    return iter_csv_rows(stream)
@@ -0,0 +1,226 @@
+# exports.py
+import csv
+import io
+import json
+from datetime import date, timedelta
+from itertools import groupby
+from typing import Iterator, List, Optional
+from sqlalchemy import and_, case, func, or_, select
+from database import SessionLocal
+from models import AdvanceTxn, AdvanceType, DailyHours, Employee
+from payroll import employee_values, job_row, VALUE_FIELDS
+
+# Rows fetched per round trip from the server-side cursor, and rows per yielded chunk
+EXPORT_BATCH = 500
+
+SUMMARY_FIELDS = ["emp_no", "employee_name", "OT", "total_hours", "normal_ot", "holiday_ot"]
+JOB_HOURS_FIELDS = ["job_no", "emp_no", "name", "total_hours", "reg_hours", "not_hours", "hot_hours",
+                    "base_value", "ot_value", "total_value"]
+STATEMENT_FIELDS = ["emp_no", "ym", "opening", "advances", "increases", "payments", "deferrals", "closing"]
+
+
+def encode_rows(fmt: str, fieldnames: List[str], rows: Iterator[dict]) -> Iterator[bytes]:
+    """
+    Encode dict rows as CSV (with header) or NDJSON, yielding a chunk every EXPORT_BATCH rows.
+    """
+    if fmt == "ndjson":
+        buf = []
+        for row in rows:
+            buf.append(json.dumps(row, default=str, separators=(",", ":")))
+            if len(buf) >= EXPORT_BATCH:
+                yield ("\n".join(buf) + "\n").encode()
+                buf = []
+        if buf:
+            yield ("\n".join(buf) + "\n").encode()
+        return
+
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    for n, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if n % EXPORT_BATCH == 0:
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue().encode()
+
+
+def _stream(stmt):
+    """
+    Execute on a session owned by the generator (the request session is closed
+    before the body is streamed) through a server-side cursor.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH))
+        yield from result
+    finally:
+        db.close()
+
+
+def summary_date_fields(start: date, end: date) -> List[str]:
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def summary_rows(start: date, end: date, fmt: str) -> Iterator[dict]:
+    """
+    One row per employee, computed as the (emp_no, date)-ordered cursor advances.
+    CSV rows carry one column per day; NDJSON rows carry a sparse entries_by_date.
+    """
+    stmt = (
+        select(
+            Employee.emp_no,
+            Employee.name,
+            Employee.OT,
+            DailyHours.date,
+            func.sum(DailyHours.hours),
+            func.group_concat(DailyHours.timesheet_ids),
+        )
+        .outerjoin(DailyHours, and_(
+            DailyHours.emp_no == Employee.emp_no,
+            DailyHours.date >= start,
+            DailyHours.date <= end,
+        ))
+        .group_by(Employee.emp_no, Employee.name, Employee.OT, DailyHours.date)
+        .order_by(Employee.emp_no, DailyHours.date)
+    )
+
+    for emp_no, emp_rows in groupby(_stream(stmt), key=lambda r: r[0]):
+        row = {"emp_no": emp_no, "employee_name": None, "OT": None,
+               "total_hours": 0.0, "normal_ot": 0.0, "holiday_ot": 0.0}
+        days = {}
+        day_hours = []
+        for _, name, ot, d, hours, ts_ids in emp_rows:
+            row["employee_name"], row["OT"] = name, ot
+            if d is None:
+                continue
+            hrs = float(hours or 0)
+            day_hours.append((d, hrs))
+            if fmt == "ndjson":
+                days[d.isoformat()] = {
+                    "total_hours": hrs,
+                    "timesheet_ids": [int(i) for i in str(ts_ids).split(",")] if ts_ids else [],
+                }
+            else:
+                days[d.isoformat()] = round(hrs, 2)
+
+        rec = employee_values(day_hours, 0.0, "NO")
+        row["total_hours"] = round(rec["total_hours"], 2)
+        row["normal_ot"] = round(rec["not_hours"], 2)
+        row["holiday_ot"] = round(rec["hot_hours"], 2)
+        if fmt == "ndjson":
+            row["entries_by_date"] = days
+        else:
+            row.update(days)
+        yield row
+
+
+def job_hours_rows(job_no: str, start: Optional[date] = None, end: Optional[date] = None) -> Iterator[dict]:
+    """
+    Per-employee job-hours rows followed by a TOTAL row, computed one employee at a time.
+    """
+    stmt = (
+        select(
+            DailyHours.emp_no,
+            DailyHours.date,
+            DailyHours.hours,
+            Employee.name,
+            Employee.base_pay,
+            Employee.OT,
+        )
+        .join(Employee, Employee.emp_no == DailyHours.emp_no)
+        .where(DailyHours.job_no == job_no)
+        .order_by(DailyHours.emp_no, DailyHours.date)
+    )
+    if start:
+        stmt = stmt.where(DailyHours.date >= start)
+    if end:
+        stmt = stmt.where(DailyHours.date <= end)
+
+    totals = dict.fromkeys(VALUE_FIELDS, 0.0)
+    for emp_no, emp_rows in groupby(_stream(stmt), key=lambda r: r[0]):
+        info = None
+        days = []
+        for r in emp_rows:
+            info = r
+            days.append((r.date, float(r.hours or 0.0)))
+        rec = employee_values(days, float(info.base_pay or 0.0), info.OT or "NO")
+        for k in totals:
+            totals[k] += rec[k]
+        yield job_row(job_no, emp_no, info.name, rec)
+
+    yield job_row(job_no, "TOTAL", "", totals)
+
+
+def month_range(from_ym: str, to_ym: str) -> List[str]:
+    y, m = int(from_ym[:4]), int(from_ym[5:7])
+    out = []
+    while f"{y:04d}-{m:02d}" <= to_ym:
+        out.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+def _sum_of(txn_type: AdvanceType):
+    return func.sum(case((AdvanceTxn.type == txn_type, AdvanceTxn.amount), else_=0))
+
+
+def advance_statement_rows(from_ym: str, to_ym: str) -> Iterator[dict]:
+    """
+    Monthly advances statement per account over from_ym..to_ym, from one query:
+    per-(emp_no, ym) sums by type, a running SUM() OVER for the closing
+    balance, and LEAD() to keep only the last month before the range (for the
+    opening). Months without transactions carry the balance forward.
+    Payments are negative, so opening + advances + increases + payments = closing.
+    """
+    monthly = (
+        select(
+            AdvanceTxn.emp_no,
+            AdvanceTxn.ym,
+            _sum_of(AdvanceType.ADVANCE).label("advances"),
+            _sum_of(AdvanceType.INCREASE).label("increases"),
+            _sum_of(AdvanceType.PAYMENT).label("payments"),
+            func.sum(case((AdvanceTxn.type == AdvanceType.DEFER, 1), else_=0)).label("deferrals"),
+            func.sum(AdvanceTxn.amount).label("net"),
+        )
+        .where(AdvanceTxn.ym <= to_ym)
+        .group_by(AdvanceTxn.emp_no, AdvanceTxn.ym)
+        .subquery()
+    )
+    running = select(
+        monthly,
+        func.sum(monthly.c.net).over(partition_by=monthly.c.emp_no, order_by=monthly.c.ym).label("closing"),
+        func.lead(monthly.c.ym).over(partition_by=monthly.c.emp_no, order_by=monthly.c.ym).label("next_ym"),
+    ).subquery()
+    stmt = (
+        select(running)
+        .where(or_(running.c.ym >= from_ym, running.c.next_ym.is_(None), running.c.next_ym >= from_ym))
+        .order_by(running.c.emp_no, running.c.ym)
+    )
+
+    months = month_range(from_ym, to_ym)
+    for emp_no, emp_rows in groupby(_stream(stmt), key=lambda r: r.emp_no):
+        carry = 0.0
+        by_ym = {}
+        for r in emp_rows:
+            if r.ym < from_ym:
+                carry = float(r.closing or 0)
+            else:
+                by_ym[r.ym] = r
+        for ym in months:
+            r = by_ym.get(ym)
+            if r is None:
+                if carry == 0:
+                    continue
+                row = {"advances": 0.0, "increases": 0.0, "payments": 0.0, "deferrals": 0, "closing": carry}
+            else:
+                row = {
+                    "advances": round(float(r.advances or 0), 2),
+                    "increases": round(float(r.increases or 0), 2),
+                    "payments": round(float(r.payments or 0), 2),
+                    "deferrals": int(r.deferrals or 0),
+                    "closing": round(float(r.closing or 0), 2),
+                }
+            yield {"emp_no": emp_no, "ym": ym, "opening": round(carry, 2), **row}
+            carry = row["closing"]
@@ -0,0 +1,65 @@
+# fast_json.py
+from decimal import Decimal
+from typing import Any, Iterable, Sequence
+import orjson
+from fastapi import Request, Response
+
+# Large list endpoints skip FastAPI's response_model round trip (validate, then
+# jsonable_encoder, then json.dumps) and encode straight to bytes. The
+# response_model stays on the route for the OpenAPI schema.
+
+
+def _decimal_as_str(obj):
+    # Same text pydantic emits for Decimal fields; date/time/datetime are native to orjson
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _decimal_as_float(obj):
+    # What jsonable_encoder does for untyped (dict) payloads
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any, decimal_as_float: bool = False) -> bytes:
+    return orjson.dumps(
+        obj,
+        default=_decimal_as_float if decimal_as_float else _decimal_as_str,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def json_response(obj: Any, **kwargs) -> Response:
+    return Response(content=dumps(obj), media_type="application/json", **kwargs)
+
+
+def row_dicts(fields: Sequence[str], rows: Iterable[tuple], floats: Sequence[str] = ()) -> list:
+    """
+    Row tuples to dicts without a model per row. Columns named in `floats`
+    are DECIMAL in the database but float in the API.
+    """
+    float_idx = [fields.index(f) for f in floats]
+    if not float_idx:
+        return [dict(zip(fields, r)) for r in rows]
+    out = []
+    for r in rows:
+        vals = list(r)
+        for i in float_idx:
+            if vals[i] is not None:
+                vals[i] = float(vals[i])
+        out.append(dict(zip(fields, vals)))
+    return out
+
+
+def rows_response(fields: Sequence[str], rows: Iterable[tuple], floats: Sequence[str] = ()) -> Response:
+    return json_response(row_dicts(fields, rows, floats))
@@ -0,0 +1,259 @@
+# ledger.py
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import and_, delete, event, func, insert, inspect as sa_inspect, or_, select
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import AdvanceCheckpoint, AdvanceTxn
+
+# Every transaction type moves the balance by its signed amount:
+# ADVANCE/INCREASE positive, PAYMENT negative, DEFER zero.
+
+ZERO = Decimal("0")
+
+
+def _ym(d) -> str:
+    return d.strftime("%Y-%m")
+
+
+def _dec(v) -> Decimal:
+    return Decimal(str(v or 0))
+
+
+def refresh_checkpoints(db: Session, keys: Iterable[Tuple[str, str]]):
+    """
+    Recompute checkpoints for (emp_no, ym) keys written in this transaction.
+    A change in one month shifts every later month, so each employee is
+    recomputed from its earliest touched month on. Employees sharing a start
+    month (e.g. the monthly run) are done together in four statements.
+    """
+    first = {}
+    for emp_no, ym in keys:
+        if ym and (emp_no not in first or ym < first[emp_no]):
+            first[emp_no] = ym
+    by_start = defaultdict(list)
+    for emp_no, ym in first.items():
+        by_start[ym].append(emp_no)
+
+    for start_ym, emp_nos in by_start.items():
+        # Opening = closing of each employee's last checkpoint before start_ym
+        latest = (
+            select(AdvanceCheckpoint.emp_no, func.max(AdvanceCheckpoint.ym).label("ym"))
+            .where(AdvanceCheckpoint.emp_no.in_(emp_nos), AdvanceCheckpoint.ym < start_ym)
+            .group_by(AdvanceCheckpoint.emp_no)
+            .subquery()
+        )
+        balance = {
+            emp_no: _dec(closing)
+            for emp_no, closing in db.execute(
+                select(AdvanceCheckpoint.emp_no, AdvanceCheckpoint.closing)
+                .join(latest, and_(AdvanceCheckpoint.emp_no == latest.c.emp_no, AdvanceCheckpoint.ym == latest.c.ym))
+            )
+        }
+
+        nets = db.execute(
+            select(AdvanceTxn.emp_no, AdvanceTxn.ym, func.sum(AdvanceTxn.amount), func.count())
+            .where(AdvanceTxn.emp_no.in_(emp_nos), AdvanceTxn.ym >= start_ym)
+            .group_by(AdvanceTxn.emp_no, AdvanceTxn.ym)
+            .order_by(AdvanceTxn.emp_no, AdvanceTxn.ym)
+        ).all()
+
+        rows = []
+        for emp_no, ym, net, count in nets:
+            opening = balance.get(emp_no, ZERO)
+            balance[emp_no] = opening + _dec(net)
+            rows.append({"emp_no": emp_no, "ym": ym, "opening": opening, "closing": balance[emp_no], "txn_count": count})
+
+        db.execute(
+            delete(AdvanceCheckpoint)
+            .where(AdvanceCheckpoint.emp_no.in_(emp_nos), AdvanceCheckpoint.ym >= start_ym)
+        )
+        if rows:
+            db.execute(insert(AdvanceCheckpoint), rows)
+
+
+def rebuild_checkpoints(db: Session) -> int:
+    """
+    Backfill: regenerate every checkpoint from advance_txns. Commits.
+    """
+    db.execute(delete(AdvanceCheckpoint))
+    emp_nos = [e for (e,) in db.execute(select(AdvanceTxn.emp_no).distinct())]
+    refresh_checkpoints(db, [(e, "0000-00") for e in emp_nos])
+    db.commit()
+    return db.query(func.count()).select_from(AdvanceCheckpoint).scalar()
+
+
+def checkpoints_need_backfill(db: Session) -> bool:
+    return db.query(AdvanceCheckpoint.emp_no).first() is None and db.query(AdvanceTxn.id).first() is not None
+
+
+def balance_as_of(db: Session, emp_no: str, ym: str) -> Optional[Decimal]:
+    """
+    Closing balance at the end of ym: one checkpoint lookup. None if the
+    employee had no transactions up to then.
+    """
+    closing = (
+        db.query(AdvanceCheckpoint.closing)
+        .filter(AdvanceCheckpoint.emp_no == emp_no, AdvanceCheckpoint.ym <= ym)
+        .order_by(AdvanceCheckpoint.ym.desc())
+        .limit(1)
+        .scalar()
+    )
+    return None if closing is None else _dec(closing)
+
+
+def month_ledger(db: Session, emp_no: str, ym: str) -> dict:
+    """
+    Opening balance, the month's transactions with a running balance, and
+    the closing balance: one checkpoint lookup plus one month of transactions.
+    """
+    cp = (
+        db.query(AdvanceCheckpoint.ym, AdvanceCheckpoint.opening, AdvanceCheckpoint.closing)
+        .filter(AdvanceCheckpoint.emp_no == emp_no, AdvanceCheckpoint.ym <= ym)
+        .order_by(AdvanceCheckpoint.ym.desc())
+        .limit(1)
+        .first()
+    )
+    if cp is None:
+        opening = ZERO
+    else:
+        opening = _dec(cp.opening) if cp.ym == ym else _dec(cp.closing)
+
+    txns = []
+    running = opening
+    if cp is not None and cp.ym == ym:
+        for t in (
+            db.query(AdvanceTxn)
+            .filter(AdvanceTxn.emp_no == emp_no, AdvanceTxn.ym == ym)
+            .order_by(AdvanceTxn.ts, AdvanceTxn.id)
+        ):
+            running += _dec(t.amount)
+            txns.append({
+                "id": t.id,
+                "ts": t.ts.isoformat(),
+                "type": t.type.value if t.type else None,
+                "amount": float(t.amount or 0),
+                "note": t.note or "",
+                "balance": float(running),
+            })
+
+    return {"emp_no": emp_no, "ym": ym, "opening": float(opening), "closing": float(running), "txns": txns}
+
+
+def _history_cursor(emp_no: str, ts, txn_id: int) -> str:
+    return f"{emp_no}|{ts.isoformat()}|{txn_id}"
+
+
+def parse_history_cursor(cursor: str) -> Tuple[str, date, int]:
+    emp_no, ts, txn_id = cursor.rsplit("|", 2)
+    return emp_no, date.fromisoformat(ts), int(txn_id)
+
+
+def batch_history(
+    db: Session,
+    emp_nos: Optional[List[str]],
+    from_ym: Optional[str],
+    to_ym: Optional[str],
+    limit: int,
+    cursors: Iterable[Tuple[str, date, int]] = (),
+) -> List[dict]:
+    """
+    Newest-first transactions for many employees in one query: up to `limit`
+    per employee, numbered with ROW_NUMBER() over (emp_no, ym) so each
+    partition is read in ix_adv_txns_emp_ym order. A cursor continues one
+    employee after (ts, id); a page requested with cursors is a continuation
+    and returns only those employees, the rest being finished.
+    """
+    rn = func.row_number().over(
+        partition_by=AdvanceTxn.emp_no,
+        order_by=(AdvanceTxn.ym.desc(), AdvanceTxn.ts.desc(), AdvanceTxn.id.desc()),
+    ).label("rn")
+    inner = select(
+        AdvanceTxn.id, AdvanceTxn.emp_no, AdvanceTxn.ts, AdvanceTxn.ym,
+        AdvanceTxn.type, AdvanceTxn.amount, AdvanceTxn.note, rn,
+    )
+    if emp_nos is not None:
+        inner = inner.where(AdvanceTxn.emp_no.in_(emp_nos))
+    if from_ym:
+        inner = inner.where(AdvanceTxn.ym >= from_ym)
+    if to_ym:
+        inner = inner.where(AdvanceTxn.ym <= to_ym)
+    cursors = {emp_no: (ts, txn_id) for emp_no, ts, txn_id in cursors}
+    if cursors:
+        inner = inner.where(or_(
+            *(
+                and_(AdvanceTxn.emp_no == emp_no, or_(
+                    AdvanceTxn.ts < ts,
+                    and_(AdvanceTxn.ts == ts, AdvanceTxn.id < txn_id),
+                ))
+                for emp_no, (ts, txn_id) in cursors.items()
+            ),
+        ))
+    page = inner.subquery()
+    rows = db.execute(
+        select(page).where(page.c.rn <= limit + 1).order_by(page.c.emp_no, page.c.rn)
+    ).all()
+
+    if cursors:
+        groups = {e: [] for e in (emp_nos if emp_nos is not None else sorted(cursors)) if e in cursors}
+    else:
+        groups = {e: [] for e in emp_nos or []}
+    for r in rows:
+        groups.setdefault(r.emp_no, []).append(r)
+    out = []
+    for emp_no, txns in groups.items():
+        more = len(txns) > limit
+        txns = txns[:limit]
+        out.append({
+            "emp_no": emp_no,
+            "items": [
+                {
+                    "id": t.id,
+                    "ts": t.ts.isoformat(),
+                    "ym": t.ym,
+                    "type": t.type.value if t.type else None,
+                    "amount": float(t.amount or 0.0),
+                    "note": t.note or "",
+                }
+                for t in txns
+            ],
+            "next_cursor": _history_cursor(emp_no, txns[-1].ts, txns[-1].id) if more else None,
+        })
+    return out
+
+
+# ---- ORM writes to advance_txns refresh checkpoints in the same flush ----
+
+def _txn_keys(txn: AdvanceTxn):
+    keys = set()
+    state = sa_inspect(txn)
+    hist = state.attrs.ts.history
+    for d in (*hist.added, *hist.unchanged, *hist.deleted):
+        if d is not None:
+            keys.add((txn.emp_no, _ym(d)))
+    emp_hist = state.attrs.emp_no.history
+    for emp_no in emp_hist.deleted:
+        if txn.ts is not None:
+            keys.add((emp_no, _ym(txn.ts)))
+    return keys
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_after_flush(session: Session, flush_context):
+    keys = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, AdvanceTxn):
+            keys |= _txn_keys(obj)
+    if keys:
+        refresh_checkpoints(session, keys)
+
+
+if __name__ == "__main__":
+    # python ledger.py   (rebuild every checkpoint)
+    session = SessionLocal()
+    try:
+        print(f"[Ledger] advance_checkpoints rebuilt: {rebuild_checkpoints(session)} rows")
+    finally:
+        session.close()
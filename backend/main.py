@@ -1,25 +1,50 @@
 from decimal import Decimal
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, or_
+from sqlalchemy.exc import IntegrityError
 from database import Base, engine, SessionLocal
-from models import Timesheet, TimesheetEntry, Trade, Employee, Attendance, AdvanceAccount, AdvanceTxn, AdvanceType
-from schemas import TimesheetIn, TimesheetEntryUpdate, TimesheetOut, TimesheetEntryIn, ReportOut, EmployeeOut, TimesheetEntryOut, TimesheetUpdate, TradeOut, AttendanceItemIn, AttendanceItemOut, AttendanceBulkIn, AdvanceCreateIn, AdvanceCreateOut, PaymentUpdateIn, PaymentUpdateOut, InstallmentUpdateIn, InstallmentUpdateOut, IncreaseAdvanceIn, IncreaseAdvanceOut, BalanceOut
+from models import Timesheet, TimesheetEntry, Employee, Attendance, AdvanceAccount, AdvanceTxn, AdvanceType, DailyHours, PayrollPeriod
+from schemas import TimesheetIn, TimesheetEntryUpdate, TimesheetOut, TimesheetEntryIn, ReportOut, EmployeeOut, TimesheetUpdate, TradeOut, AttendanceItemIn, AttendanceItemOut, AttendanceBulkIn, AttendanceMultiBulkIn, AdvanceCreateIn, AdvanceCreateOut, PaymentUpdateIn, PaymentUpdateOut, InstallmentUpdateIn, InstallmentUpdateOut, IncreaseAdvanceIn, IncreaseAdvanceOut, BalanceOut, ImportReportOut, TimesheetHeaderOut, TimesheetPageOut
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from scheduler import start_scheduler, stop_scheduler, run_monthly_auto_deductions
 from models import Employee
 from schemas import EmployeeOut
-from typing import List
+from typing import List, Optional
 import models
-from datetime import datetime, date, time
+from datetime import date
 from collections import defaultdict  
+from itertools import groupby
+from calendar import monthrange
+import logging
 from models import Timesheet, TimesheetEntry
-from sqlalchemy.orm import aliased
+from sqlalchemy.orm import aliased, contains_eager
 from datetime import timedelta
-
-
+from bulk_import import TimesheetImporter, detect_format, iter_upload_rows
+from rollup import daily_key, refresh_daily_hours, sheet_keys, rebuild_daily_hours, rollup_needs_backfill
+from report_cache import cached_json, TIMESHEETS, ATTENDANCE
+from migrations import ensure_generated_columns, ensure_indexes
+from exports import encode_rows, summary_rows, summary_date_fields, job_hours_rows, advance_statement_rows, SUMMARY_FIELDS, JOB_HOURS_FIELDS, STATEMENT_FIELDS
+from payroll import HoursMatrix, job_row, VALUE_FIELDS
+from fast_json import json_response, rows_response
+import refdata
+from advance_ops import insert_month_payments, lock_account, lock_or_create_account
+from projection import project_payoff, DEFAULT_HORIZON, MAX_HORIZON
+from ledger import balance_as_of, month_ledger, rebuild_checkpoints, checkpoints_need_backfill, batch_history, parse_history_cursor
+from attendance_ops import upsert_attendance, attendance_grid, attendance_status_counts, reconcile_attendance, mark_present
+from refdata import ref_response
+from timesheet_ops import existing_emp_nos, load_day_totals, add_day_hours, split_entry, bulk_insert_entries
+from periods import ensure_dates_open, ensure_open, load_snapshot, store_snapshot, month_bounds, whole_month
+
+
+
+logger = logging.getLogger(__name__)
 
 Base.metadata.create_all(bind=engine)
+ensure_generated_columns(engine)
+ensure_indexes(engine)
 
 app = FastAPI()
 
@@ -30,6 +55,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Grid and report bodies are highly repetitive text
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 def get_db():
     db = SessionLocal()
     try:
@@ -38,8 +65,8 @@ def get_db():
         db.close()
 
 @app.get("/employees", response_model=List[EmployeeOut])
-def get_employees(db: Session = Depends(get_db)):
-    return db.query(Employee).all()
+def get_employees(request: Request, db: Session = Depends(get_db)):
+    return ref_response(request, db, refdata.EMPLOYEES)
 
 
 
@@ -47,88 +74,84 @@ def get_employees(db: Session = Depends(get_db)):
 
 @app.post("/timesheets")
 def create_timesheet(timesheet: TimesheetIn, db: Session = Depends(get_db)):
-    ts = Timesheet(**{k: v for k, v in timesheet.dict().items() if k != "entries"})
-    db.add(ts)
-    db.commit()
-    db.refresh(ts)
-
-    for entry in timesheet.entries:
-        entries_to_add = []
-
-        if entry.from_time > entry.to_time:
-            # ✅ Split logic fix: assign full break to Part 1, zero to Part 2
-            first_hours = (
-                (datetime.combine(datetime.today(), time(23, 59)) -
-                 datetime.combine(datetime.today(), entry.from_time)).seconds
-                - (entry.break_minutes * 60)
-            ) / 3600.0
-
-            part1 = TimesheetEntry(
-                timesheet_id=ts.id,
-                employee_emp_no=entry.employee_emp_no,
-                trade_id=entry.trade_id,
-                from_time=entry.from_time,
-                to_time=time(23, 59),
-                break_minutes = entry.break_minutes,  # ✅ full break here
-                total_hours=round(first_hours, 2),
-                remarks="Split overnight entry (Part 1)"
-            )
-            entries_to_add.append((ts.date, entry.employee_emp_no, first_hours, part1))
-
-            # Create timesheet for next day
-            new_ts_date = ts.date + timedelta(days=1)
-            new_ts = Timesheet(**{**timesheet.dict(exclude={"entries"}), "date": new_ts_date})
-            db.add(new_ts)
-            db.commit()
-            db.refresh(new_ts)
-
-            second_hours = (
-                (datetime.combine(datetime.today(), entry.to_time) -
-                 datetime.combine(datetime.today(), time(0, 0))).seconds
-            ) / 3600.0
-
-            part2 = TimesheetEntry(
-                timesheet_id=new_ts.id,
-                employee_emp_no=entry.employee_emp_no,
-                trade_id=entry.trade_id,
-                from_time=time(0, 0),
-                to_time=entry.to_time,
-                break_minutes=0,  # ✅ no break on Day 2
-                total_hours=round(second_hours, 2),
-                remarks=f"Split overnight entry (Part 2 from timesheet {ts.sheet_no})"
-            )
-            entries_to_add.append((new_ts_date, entry.employee_emp_no, second_hours, part2))
+    header = timesheet.dict(exclude={"entries"})
 
-        else:
-            # Normal entry, nothing changes
-            normal_entry = TimesheetEntry(
-                timesheet_id=ts.id,
-                **entry.dict()
-            )
-            entries_to_add.append((ts.date, entry.employee_emp_no, entry.total_hours, normal_entry))
-
-    for entry_date, emp_no, hours, entry_obj in entries_to_add:
-        # Check if total exceeds 24 hours
-        total_existing_hours = db.query(func.coalesce(func.sum(TimesheetEntry.total_hours), 0))\
-            .join(Timesheet)\
-            .filter(Timesheet.date == entry_date, TimesheetEntry.employee_emp_no == emp_no)\
-            .scalar()
-
-        employee = db.query(Employee).filter(Employee.emp_no == emp_no).first()
-        emp_name = employee.name if employee else "Unknown"
-
-        if total_existing_hours + Decimal(str(hours)) > Decimal("24"):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Total hours for employee {emp_no} ({emp_name}) on {entry_date} exceed 24 hours."
-            )
+    # 1. Expand entries into (day offset, entry fields); overnight ones are split
+    fragments = [
+        (offset, timesheet.date + timedelta(days=offset), f)
+        for entry in timesheet.entries
+        for offset, f in split_entry(entry, timesheet.sheet_no)
+    ]
+
+    # 2. Validate everything before writing: one employee query, one grouped totals query
+    emp_names = existing_emp_nos(db, {f["employee_emp_no"] for _, _, f in fragments})
+    missing = sorted({f["employee_emp_no"] for _, _, f in fragments} - emp_names.keys())
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Unknown emp_no(s): {', '.join(missing)}")
+    ensure_dates_open(db, {d for _, d, _ in fragments})
+
+    totals = load_day_totals(db, {(d, f["employee_emp_no"]) for _, d, f in fragments})
+    over = add_day_hours(totals, [(d, f["employee_emp_no"], f["total_hours"]) for _, d, f in fragments])
+    if over:
+        entry_date, emp_no = over
+        raise HTTPException(
+            status_code=400,
+            detail=f"Total hours for employee {emp_no} ({emp_names[emp_no]}) on {entry_date} exceed 24 hours."
+        )
+
+    # 3. Write headers and entries atomically; all Part 2 fragments share one next-day sheet
+    sheets = {0: Timesheet(**header)}
+    if any(offset for offset, _, _ in fragments):
+        sheets[1] = Timesheet(**{**header, "date": timesheet.date + timedelta(days=1)})
+    db.add_all(sheets.values())
+    db.flush()
 
-        db.add(entry_obj)
+    bulk_insert_entries(db, [
+        {**f, "timesheet_id": sheets[offset].id} for offset, _, f in fragments
+    ])
+    refresh_daily_hours(db, {daily_key(f["employee_emp_no"], d, timesheet.job_no) for _, d, f in fragments})
 
     db.commit()
     return {"message": "Timesheet(s) created successfully"}
 
 
+@app.post("/timesheets/import", response_model=ImportReportOut)
+def import_timesheets(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    all_or_nothing: bool = Query(False),
+    dry_run: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    """
+    Bulk import of many sheets from a CSV or NDJSON upload.
+    Each row is one entry plus its sheet header fields (date, job_no, ship, site,
+    sheet_no, checked_by, authorized_by, for_company); rows with the same header
+    go on the same sheet. Rows are parsed and validated in chunks and written in
+    one transaction; invalid rows are skipped and reported.
+      - all_or_nothing: roll back everything if any row fails
+      - dry_run: validate only, never commit
+    """
+    fmt = format or detect_format(file.filename, file.content_type)
+    importer = TimesheetImporter(db)
+    report = importer.run(iter_upload_rows(file.file, fmt))
+
+    committed = not dry_run and not (all_or_nothing and report.errors)
+    if committed:
+        db.commit()
+    else:
+        db.rollback()
+
+    return ImportReportOut(
+        message="Import committed" if committed else "Import rolled back",
+        rows_read=report.rows_read,
+        entries_inserted=report.entries_inserted,
+        timesheets_created=report.timesheets_created,
+        committed=committed,
+        errors=report.errors,
+    )
+
+
 
 def get_date_range(start: date, end: date):
     current = start
@@ -136,21 +159,56 @@ def get_date_range(start: date, end: date):
         yield current
         current += timedelta(days=1)
 
+def _daily_hours_rows(db: Session, start: date, end: date):
+    """
+    One row per (emp_no, date) with summed hours and the comma-joined timesheet ids,
+    read from the daily_hours rollup (one row per job per day).
+    """
+    return (
+        db.query(
+            DailyHours.emp_no.label("emp_no"),
+            DailyHours.date.label("ts_date"),
+            func.sum(DailyHours.hours).label("hours"),
+            func.group_concat(DailyHours.timesheet_ids).label("timesheet_ids"),
+        )
+        .filter(DailyHours.date >= start, DailyHours.date <= end)
+        .group_by(DailyHours.emp_no, DailyHours.date)
+        .all()
+    )
+
+
+def _ensure_range(start: date, end: date):
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+
+
 @app.get("/reports/summary")
-def get_summary(start: date = Query(...), end: date = Query(...), db: Session = Depends(get_db)):
-    # 1. Build full date list
-    all_dates = [d.strftime("%Y-%m-%d") for d in get_date_range(start, end)]
+def get_summary(
+    request: Request,
+    start: date = Query(...),
+    end: date = Query(...),
+    sparse: bool = Query(False, description="Only include days with logged hours in entries_by_date"),
+    db: Session = Depends(get_db),
+):
+    _ensure_range(start, end)
+    return cached_json(
+        request, db, ("summary", start, end, sparse),
+        lambda: _summary_report(db, start, end, sparse),
+        TIMESHEETS, start=start, end=end,
+    )
+
 
-    # 2. Get timesheets and entries
-    timesheets = db.query(Timesheet).filter(Timesheet.date >= start, Timesheet.date <= end).all()
-    timesheet_map = {ts.id: ts.date for ts in timesheets}
-    timesheet_ids = list(timesheet_map.keys())
+def _summary_report(db: Session, start: date, end: date, sparse: bool):
+    # Closed months are served from their snapshot (stored sparse)
+    frozen = load_snapshot(db, whole_month(start, end), "summary")
+    if frozen is not None:
+        return frozen if sparse else _dense_summary(frozen, start, end)
 
-    # 3. Get all employees
-    employees = db.query(Employee).all()
-    employee_map = {emp.emp_no: emp.name for emp in employees}
+    # 1. Employees, from the reference-data cache
+    employees = refdata.employees(db).values()
 
-    # 4. Initialize report structure
+    # 2. Initialize report structure (dense: every day of the range, sparse: none)
+    all_dates = [] if sparse else [d.strftime("%Y-%m-%d") for d in get_date_range(start, end)]
     report = {
         emp.emp_no: {
             "emp_no": emp.emp_no,
@@ -159,51 +217,128 @@ def get_summary(start: date = Query(...), end: date = Query(...), db: Session =
             "entries_by_date": {
                 date_str: {"total_hours": 0.0, "timesheet_ids": []}
                 for date_str in all_dates
-            }
+            },
+            "total_hours": 0.0,
+            "holiday_ot": 0.0,
+            "normal_ot": 0.0,
         }
         for emp in employees
     }
 
-    # 5. Fill in timesheet entries
-    if timesheet_ids:
-        entries = db.query(TimesheetEntry).filter(TimesheetEntry.timesheet_id.in_(timesheet_ids)).all()
-
-        for entry in entries:
-            emp_id = entry.employee_emp_no
-            if emp_id not in report:
-                continue
-            ts_date = timesheet_map[entry.timesheet_id].strftime("%Y-%m-%d")
-            entry_data = report[emp_id]["entries_by_date"][ts_date]
-            entry_data["total_hours"] += float(entry.total_hours or 0)
-            entry_data["timesheet_ids"].append(entry.timesheet_id)
-
-    # 6. Calculate total, normal OT, holiday OT
-    for emp in report.values():
-        total = 0.0
-        hot = 0.0
-        not_ = 0.0
-
-        for date_str, entry in emp["entries_by_date"].items():
-            hrs = entry["total_hours"]
-            total += hrs
-            dt = datetime.strptime(date_str, "%Y-%m-%d")
-            if dt.weekday() == 6:  # Sunday
-                hot += hrs
-            elif hrs > 8:
-                not_ += hrs - 8
-
-        emp["total_hours"] = round(total, 2)
-        emp["holiday_ot"] = round(hot, 2)
-        emp["normal_ot"] = round(not_, 2)
+    # 3. Fill logged days from the grouped query
+    rows = _daily_hours_rows(db, start, end)
+    for row in rows:
+        emp = report.get(row.emp_no)
+        if emp is None:
+            continue
+        emp["entries_by_date"][row.ts_date.isoformat()] = {
+            "total_hours": float(row.hours or 0),
+            "timesheet_ids": [int(i) for i in str(row.timesheet_ids).split(",")] if row.timesheet_ids else [],
+        }
+
+    # 4. Totals and the Sunday = holiday OT, >8h = normal OT split from the payroll kernel
+    matrix = HoursMatrix(list(report.keys()), start, end)
+    matrix.fill((r.emp_no, r.ts_date, float(r.hours or 0)) for r in rows)
+    totals = matrix.compute()
+    for i, emp in enumerate(report.values()):
+        emp["total_hours"] = round(float(totals["total_hours"][i]), 2)
+        emp["holiday_ot"] = round(float(totals["hot_hours"][i]), 2)
+        emp["normal_ot"] = round(float(totals["not_hours"][i]), 2)
 
     return list(report.values())
 
-@app.get("/timesheets", response_model=List[TimesheetOut])
-def get_all_timesheets(db: Session = Depends(get_db)):
-    timesheets = db.query(Timesheet).all()
-    for ts in timesheets:
-        ts.entries = db.query(TimesheetEntry).filter_by(timesheet_id=ts.id).all()
-    return timesheets
+
+def _dense_summary(rows: list, start: date, end: date):
+    all_dates = [d.strftime("%Y-%m-%d") for d in get_date_range(start, end)]
+    empty = {"total_hours": 0.0, "timesheet_ids": []}
+    return [
+        {**row, "entries_by_date": {d: row["entries_by_date"].get(d, empty) for d in all_dates}}
+        for row in rows
+    ]
+
+def _export_response(fmt: str, fieldnames: List[str], rows, filename: str) -> StreamingResponse:
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+    return StreamingResponse(
+        encode_rows(fmt, fieldnames, rows),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+@app.get("/reports/summary/export")
+def export_summary(
+    start: date = Query(...),
+    end: date = Query(...),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+):
+    """
+    Streams the summary one employee per row (CSV: one column per day).
+    """
+    _ensure_range(start, end)
+    fieldnames = SUMMARY_FIELDS + summary_date_fields(start, end)
+    return _export_response(format, fieldnames, summary_rows(start, end, format), f"summary_{start}_{end}")
+
+
+TIMESHEET_PAGE_MAX = 500
+
+
+def _page_cursor(ts: Timesheet) -> str:
+    return f"{ts.date.isoformat()}_{ts.id}"
+
+
+def _parse_page_cursor(cursor: str):
+    try:
+        d, ts_id = cursor.split("_", 1)
+        return date.fromisoformat(d), int(ts_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/timesheets", response_model=TimesheetPageOut)
+def get_all_timesheets(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    job_no: Optional[str] = Query(None),
+    ship: Optional[str] = Query(None),
+    site: Optional[str] = Query(None),
+    sheet_no: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=TIMESHEET_PAGE_MAX),
+    headers_only: bool = Query(False, description="Omit entries"),
+    db: Session = Depends(get_db),
+):
+    """
+    Timesheets newest first, paged by keyset on (date, id) so deep pages cost
+    the same as the first one.
+    """
+    q = db.query(Timesheet)
+    if start:
+        q = q.filter(Timesheet.date >= start)
+    if end:
+        q = q.filter(Timesheet.date <= end)
+    for column, value in ((Timesheet.job_no, job_no), (Timesheet.ship, ship),
+                          (Timesheet.site, site), (Timesheet.sheet_no, sheet_no)):
+        if value is not None:
+            q = q.filter(column == value)
+    if cursor:
+        after_date, after_id = _parse_page_cursor(cursor)
+        q = q.filter(or_(
+            Timesheet.date < after_date,
+            and_(Timesheet.date == after_date, Timesheet.id < after_id),
+        ))
+
+    # One extra row tells whether there is a next page
+    sheets = q.order_by(Timesheet.date.desc(), Timesheet.id.desc()).limit(limit + 1).all()
+    next_cursor = _page_cursor(sheets[limit - 1]) if len(sheets) > limit else None
+    sheets = sheets[:limit]
+
+    if headers_only:
+        items = [_timesheet_header(ts) for ts in sheets]
+    else:
+        # Entries for the whole page in one joined IN query
+        loaded = {ts.id: ts for ts in _load_timesheets(db, [ts.id for ts in sheets])} if sheets else {}
+        items = [_timesheet_out(loaded[ts.id]) for ts in sheets]
+    return json_response({"items": items, "next_cursor": next_cursor})
 
 @app.put("/time-entries/{entry_id}")
 def update_time_entry(entry_id: int, data: TimesheetEntryUpdate, db: Session = Depends(get_db)):
@@ -211,105 +346,92 @@ def update_time_entry(entry_id: int, data: TimesheetEntryUpdate, db: Session = D
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     
+    sheet = db.query(Timesheet.date, Timesheet.job_no).filter(Timesheet.id == entry.timesheet_id).first()
+    ensure_dates_open(db, [sheet.date])
+    keys = {daily_key(entry.employee_emp_no, sheet.date, sheet.job_no)}
+
     for key, value in data.dict(exclude_unset=True).items():
         setattr(entry, key, value)
 
+    # Re-roll the old and (if the employee changed) the new day
+    keys.add(daily_key(entry.employee_emp_no, sheet.date, sheet.job_no))
+    refresh_daily_hours(db, keys)
+
     db.commit()
     db.refresh(entry)
     return {"message": "Entry updated", "entry": entry.id}
 
-@app.get("/timesheets/details", response_model=List[TimesheetOut])
-def get_timesheets_by_ids(timesheet_ids: List[int] = Query(...), db: Session = Depends(get_db)):
-    timesheets = db.query(Timesheet).filter(Timesheet.id.in_(timesheet_ids)).all()
-    if not timesheets:
-        raise HTTPException(status_code=404, detail="No timesheets found for provided IDs")
+MAX_DETAIL_IDS = 100
 
-    for timesheet in timesheets:
-        entries = (
-            db.query(
-                TimesheetEntry.id,
-                TimesheetEntry.employee_emp_no,
-                Employee.name.label("employee_name"),
-                TimesheetEntry.trade_id,
-                Trade.trade_name.label("trade_name"),
-                TimesheetEntry.from_time,
-                TimesheetEntry.to_time,
-                TimesheetEntry.break_minutes,
-                TimesheetEntry.total_hours,
-                TimesheetEntry.remarks,
-            )
-            .join(Employee, TimesheetEntry.employee_emp_no == Employee.emp_no)
-            .outerjoin(Trade, TimesheetEntry.trade_id == Trade.id)  # ✅ outer join
-            .filter(TimesheetEntry.timesheet_id == timesheet.id)
-            .all()
+
+def _load_timesheets(db: Session, timesheet_ids: List[int]) -> List[Timesheet]:
+    """
+    Sheets with their entries, employees and trades in a single joined query.
+    """
+    return (
+        db.query(Timesheet)
+        .outerjoin(Timesheet.entries)
+        .outerjoin(TimesheetEntry.employee)
+        .outerjoin(TimesheetEntry.trade)
+        .options(
+            contains_eager(Timesheet.entries).contains_eager(TimesheetEntry.employee),
+            contains_eager(Timesheet.entries).contains_eager(TimesheetEntry.trade),
         )
+        .filter(Timesheet.id.in_(timesheet_ids))
+        .order_by(Timesheet.id, TimesheetEntry.id)
+        .populate_existing()
+        .all()
+    )
 
-        timesheet.entries = [
-            {
-                "id": entry.id,
-                "employee_emp_no": entry.employee_emp_no,
-                "employee_name": entry.employee_name,
-                "trade_id": entry.trade_id,
-                "trade_name": entry.trade_name or "N/A",  # ✅ default to "N/A"
-                "from_time": entry.from_time.strftime("%H:%M") if entry.from_time else None,
-                "to_time": entry.to_time.strftime("%H:%M") if entry.to_time else None,
-                "break_minutes": entry.break_minutes,
-                "total_hours": entry.total_hours,
-                "remarks": entry.remarks
-            }
-            for entry in entries
-        ]
-
-    return timesheets
 
+TIMESHEET_HEADER_FIELDS = list(TimesheetHeaderOut.model_fields)
 
-@app.get("/timesheets/{timesheet_id}", response_model=TimesheetOut)
-def get_timesheet_by_id(timesheet_id: int, db: Session = Depends(get_db)):
-    timesheet = db.query(Timesheet).filter(Timesheet.id == timesheet_id).first()
-    if not timesheet:
-        raise HTTPException(status_code=404, detail="Timesheet not found")
 
-    results = (
-        db.query(
-            TimesheetEntry.id,
-            TimesheetEntry.employee_emp_no.label("employee_emp_no"),
-            TimesheetEntry.trade_id,
-            Employee.name.label("employee_name"),
-            Trade.trade_name.label("trade_name"),
-            TimesheetEntry.from_time,
-            TimesheetEntry.to_time,
-            TimesheetEntry.break_minutes,
-            TimesheetEntry.total_hours,
-            TimesheetEntry.remarks
-        )
-        .join(Employee, TimesheetEntry.employee_emp_no == Employee.emp_no)
-        .outerjoin(Trade, TimesheetEntry.trade_id == Trade.id)  # ✅ outer join
-        .filter(TimesheetEntry.timesheet_id == timesheet.id)
-        .all()
-    )
+def _timesheet_header(ts: Timesheet) -> dict:
+    return {f: getattr(ts, f) for f in TIMESHEET_HEADER_FIELDS}
 
-    timesheet.entries = [
-        TimesheetEntryOut(
-            id=row.id,
-            employee_emp_no=row.employee_emp_no,
-            employee_name=row.employee_name,
-            trade_id=row.trade_id,
-            trade_name=row.trade_name or "N/A",  # ✅ default to "N/A"
-            from_time=row.from_time.strftime("%H:%M") if row.from_time else None,
-            to_time=row.to_time.strftime("%H:%M") if row.to_time else None,
-            break_minutes=row.break_minutes,
-            total_hours=row.total_hours,
-            remarks=row.remarks
-        )
-        for row in results
+
+def _timesheet_out(ts: Timesheet) -> dict:
+    # Plain dicts in the TimesheetOut shape, encoded by fast_json
+    out = _timesheet_header(ts)
+    out["entries"] = [
+        {
+            "id": e.id,
+            "employee_emp_no": e.employee_emp_no,
+            "employee_name": e.employee.name if e.employee else None,
+            "trade_id": e.trade_id,
+            "trade_name": e.trade.trade_name if e.trade else "N/A",
+            "from_time": e.from_time,
+            "to_time": e.to_time,
+            "break_minutes": e.break_minutes,
+            "total_hours": float(e.total_hours) if e.total_hours is not None else None,
+            "remarks": e.remarks,
+        }
+        for e in ts.entries
     ]
+    return out
 
-    return timesheet
 
+@app.get("/timesheets/details", response_model=List[TimesheetOut])
+def get_timesheets_by_ids(timesheet_ids: List[int] = Query(...), db: Session = Depends(get_db)):
+    ids = sorted(set(timesheet_ids))
+    if len(ids) > MAX_DETAIL_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_DETAIL_IDS} timesheet ids per request")
 
+    timesheets = _load_timesheets(db, ids)
+    if not timesheets:
+        raise HTTPException(status_code=404, detail="No timesheets found for provided IDs")
+    return json_response([_timesheet_out(ts) for ts in timesheets])
+
+
+@app.get("/timesheets/{timesheet_id}", response_model=TimesheetOut)
+def get_timesheet_by_id(timesheet_id: int, db: Session = Depends(get_db)):
+    timesheets = _load_timesheets(db, [timesheet_id])
+    if not timesheets:
+        raise HTTPException(status_code=404, detail="Timesheet not found")
+    return json_response(_timesheet_out(timesheets[0]))
 
 
-    
 @app.put("/timesheets/{timesheet_id}")
 def update_timesheet(timesheet_id: int, data: TimesheetUpdate, db: Session = Depends(get_db)):
     print("Data received:", data)
@@ -319,21 +441,23 @@ def update_timesheet(timesheet_id: int, data: TimesheetUpdate, db: Session = Dep
     if not timesheet:
         raise HTTPException(status_code=404, detail="Timesheet not found")
 
+    old_keys = sheet_keys(db, timesheet.id)
+    ensure_dates_open(db, [timesheet.date, data.date])
+
     for key, value in data.dict(exclude_unset=True).items():
         setattr(timesheet, key, value)
 
+    # A date or job_no change moves this sheet's hours to another rollup key
+    new_keys = {daily_key(emp_no, timesheet.date, timesheet.job_no) for emp_no, _, _ in old_keys}
+    refresh_daily_hours(db, old_keys | new_keys)
+
     db.commit()
     db.refresh(timesheet)
     return {"message": "Timesheet updated", "timesheet_id": timesheet.id}
 
-@app.get("/employees", response_model=List[EmployeeOut])
-def get_employees(db: Session = Depends(get_db)):
-    return db.query(Employee).all()
-
-
 @app.get("/trades", response_model=List[TradeOut])
-def get_trades(db: Session = Depends(get_db)):
-    return db.query(Trade).all()
+def get_trades(request: Request, db: Session = Depends(get_db)):
+    return ref_response(request, db, refdata.TRADES)
 
 from typing import List
 
@@ -345,49 +469,92 @@ def get_attendance(date: date = Query(...), db: Session = Depends(get_db)):
         for r in rows
     ]
 
+ATTENDANCE_GRID_MAX_DAYS = 366
+
+
+@app.get("/attendance/grid")
+def attendance_grid_view(
+    request: Request,
+    month: Optional[int] = Query(None, ge=1, le=12),
+    year: Optional[int] = Query(None),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Every employee x day for a month (or start..end) in one query, as one
+    status-code string per employee; rows[emp][i] is day start+i and
+    legend[codes.index(ch)] its status.
+    """
+    if month and year:
+        start, end = date(year, month, 1), date(year, month, monthrange(year, month)[1])
+    elif not (start and end):
+        raise HTTPException(status_code=400, detail="Pass month and year, or start and end")
+    if end < start or (end - start).days >= ATTENDANCE_GRID_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be 1 to {ATTENDANCE_GRID_MAX_DAYS} days")
+
+    # Employees are read inside compute, after cached_json has synced refdata
+    return cached_json(
+        request, db, ("attendance_grid", start, end),
+        lambda: attendance_grid(db, sorted(refdata.employees(db), key=_emp_sort_key), start, end),
+        ATTENDANCE, start=start, end=end,
+    )
+
 @app.post("/attendance/bulk")
 def upsert_attendance_bulk(payload: AttendanceBulkIn, db: Session = Depends(get_db)):
-    emp_nos = {e.emp_no for e in db.query(Employee.emp_no).all()}
-    missing = [r.emp_no for r in payload.records if r.emp_no not in emp_nos]
+    return _write_attendance(db, [(r.emp_no, payload.date, r.status, r.notes) for r in payload.records])
+
+
+@app.post("/attendance/bulk-multi")
+def upsert_attendance_multi(payload: AttendanceMultiBulkIn, db: Session = Depends(get_db)):
+    """
+    Same as /attendance/bulk, but each record carries its own att_date.
+    """
+    return _write_attendance(db, [(r.emp_no, r.att_date, r.status, r.notes) for r in payload.records])
+
+
+def _write_attendance(db: Session, records: list):
+    emp_nos = refdata.employees(db)
+    missing = sorted({emp_no for emp_no, _, _, _ in records if emp_no not in emp_nos})
     if missing:
         raise HTTPException(status_code=400, detail=f"Unknown emp_no(s): {', '.join(missing)}")
+    ensure_dates_open(db, {att_date for _, att_date, _, _ in records})
 
-    for rec in payload.records:
-        row = (
-            db.query(Attendance)
-            .filter(Attendance.emp_no == rec.emp_no, Attendance.att_date == payload.date)
-            .one_or_none()
-        )
-        if row:
-            row.status = rec.status
-            row.notes = rec.notes or ""
-        else:
-            db.add(Attendance(emp_no=rec.emp_no, att_date=payload.date, status=rec.status, notes=rec.notes or ""))
-
+    written = upsert_attendance(db, records)
     db.commit()
-    return {"ok": True}
+    return {"ok": True, "written": written}
 
-@app.get("/attendance/summary")
-def attendance_summary(month: int, year: int, db: Session = Depends(get_db)):
-    """
-    Returns absence count (excluding SL) for each employee in the 15th-to-15th window.
-    month = selected month (1–12)
-    year = selected year
-    """
-    # Determine window: 15th of previous month → 15th of current month
+def _ot_window(month: int, year: int):
+    # 15th of previous month → 15th of current month; attendance reports
+    # count it half-open [start, end), so each 15th falls in one cycle only
     if month == 1:
         prev_month = 12
         prev_year = year - 1
     else:
         prev_month = month - 1
         prev_year = year
+    return date(prev_year, prev_month, 15), date(year, month, 15)
 
-    start = date(prev_year, prev_month, 15)
-    end = date(year, month, 15)
+
+@app.get("/attendance/summary")
+def attendance_summary(request: Request, month: int, year: int, db: Session = Depends(get_db)):
+    """
+    Returns absence count (excluding SL) for each employee in the 15th-to-15th window.
+    month = selected month (1–12)
+    year = selected year
+    """
+    start, end = _ot_window(month, year)
+    return cached_json(
+        request, db, ("attendance_summary", start, end),
+        lambda: _attendance_summary_report(db, start, end),
+        ATTENDANCE, start=start, end=end,
+    )
+
+
+def _attendance_summary_report(db: Session, start: date, end: date):
 
     # Get all employees first
-    emp_list = db.query(Employee.emp_no).all()
-    base = {e.emp_no: {"emp_no": e.emp_no, "absent_non_sl": 0} for e in emp_list}
+    base = {emp_no: {"emp_no": emp_no, "absent_non_sl": 0} for emp_no in refdata.employees(db)}
 
     # Count non-SL absences in range
     rows = (
@@ -406,38 +573,35 @@ def attendance_summary(month: int, year: int, db: Session = Depends(get_db)):
 
 @app.get("/attendance/absences")
 def get_absences(
+    request: Request,
     start: date = Query(...),
     end: date = Query(...),
     db: Session = Depends(get_db),
 ):
-    # Pull records in range
+    return cached_json(
+        request, db, ("absences", start, end),
+        lambda: _absences_report(db, start, end),
+        ATTENDANCE, start=start, end=end,
+    )
+
+
+def _absences_report(db: Session, start: date, end: date):
+    # Only non-P rows leave the database; ix_attendance_date_emp serves the date
+    # range, the ORDER BY puts them in (emp_no, date) order for groupby
+    status = func.upper(func.trim(Attendance.status))
     rows = (
-        db.query(Attendance)
+        db.query(Attendance.emp_no, Attendance.att_date, status.label("status"))
         .filter(Attendance.att_date >= start, Attendance.att_date <= end)
+        .filter(status != "P")  # exclude only Present
+        .order_by(Attendance.emp_no, Attendance.att_date)
         .all()
     )
 
-    abs_map = {}
-    for r in rows:
-        status_clean = (r.status or "").strip().upper()
-        if status_clean == "P":
-            continue  # exclude only Present
-
-        emp = r.emp_no
-        if emp not in abs_map:
-            abs_map[emp] = {"count": 0, "dates": []}
-
-        abs_map[emp]["count"] += 1
-        abs_map[emp]["dates"].append({
-            "date": r.att_date.isoformat(),  # <-- att_date, not date
-            "status": status_clean
-        })
-
-    # Return grouped list
-    return [
-        {"emp_no": emp, "count": v["count"], "dates": v["dates"]}
-        for emp, v in abs_map.items()
-    ]
+    out = []
+    for emp_no, emp_rows in groupby(rows, key=lambda r: r.emp_no):
+        dates = [{"date": r.att_date.isoformat(), "status": r.status} for r in emp_rows]
+        out.append({"emp_no": emp_no, "count": len(dates), "dates": dates})
+    return out
 
 
 @app.get("/attendance/details")
@@ -450,18 +614,101 @@ def get_absence_details(emp_no: str, start: date = Query(...), end: date = Query
         .filter(Attendance.emp_no == emp_no)
         .filter(Attendance.att_date >= start, Attendance.att_date < end)
         .filter(Attendance.status != "SL")
+        .order_by(Attendance.att_date)
         .all()
     )
     return [{"date": r.att_date.isoformat(), "status": r.status} for r in rows]
 
-from calendar import monthrange
-from datetime import datetime
 
-def days_in_month(d: datetime) -> int:
-    return monthrange(d.year, d.month)[1]
+RECONCILE_MAX_DAYS = 366
+
+
+def _reconcile_range(start: date, end: date):
+    if end < start or (end - start).days >= RECONCILE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be 1 to {RECONCILE_MAX_DAYS} days")
+
+
+@app.get("/attendance/reconcile")
+def attendance_reconcile(start: date = Query(...), end: date = Query(...), db: Session = Depends(get_db)):
+    """
+    Days where attendance and timesheet hours disagree (see reconcile_attendance).
+    """
+    _reconcile_range(start, end)
+    return reconcile_attendance(db, start, end)
+
+
+@app.post("/attendance/reconcile")
+def attendance_reconcile_mark(
+    start: date = Query(...),
+    end: date = Query(...),
+    overwrite_absent: bool = Query(False, description="Also mark P over existing non-P rows that have hours"),
+    db: Session = Depends(get_db),
+):
+    """
+    Reconcile, then mark P on logged days through the bulk upsert. Returns the
+    mismatch report from before marking, plus marked/skipped counts.
+    """
+    _reconcile_range(start, end)
+    report = reconcile_attendance(db, start, end)
+    result = mark_present(db, report, overwrite_absent)
+    db.commit()
+    return {**report, **result}
+
+
+@app.get("/attendance/counts")
+def attendance_counts(
+    request: Request,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    month: Optional[int] = Query(None, ge=1, le=12),
+    year: Optional[int] = Query(None),
+    window: str = Query("ot", pattern="^(ot|month)$", description="With month/year: 15th-to-15th (ot) or calendar month"),
+    db: Session = Depends(get_db),
+):
+    """
+    Per-status day counts per employee over start..end (inclusive), or over a
+    month's OT cycle / calendar month, from one grouped query.
+    """
+    if month and year:
+        if window == "ot":
+            start, end = _ot_window(month, year)
+            # Inclusive here: stop the day before the 15th, as /attendance/summary does
+            end -= timedelta(days=1)
+        else:
+            start, end = date(year, month, 1), date(year, month, monthrange(year, month)[1])
+    elif not (start and end):
+        raise HTTPException(status_code=400, detail="Pass start and end, or month and year")
+
+    # Employees are read inside compute, after cached_json has synced refdata
+    return cached_json(
+        request, db, ("attendance_counts", start, end),
+        lambda: attendance_status_counts(db, sorted(refdata.employees(db), key=_emp_sort_key), start, end),
+        ATTENDANCE, start=start, end=end,
+    )
 
 @app.get("/job-hours/{job_no}")
-def job_hours_by_job(job_no: str, db: Session = Depends(get_db)):
+def job_hours_by_job(request: Request, job_no: str, db: Session = Depends(get_db)):
+    return cached_json(
+        request, db, ("job_hours", job_no),
+        lambda: _job_hours_report(db, job_no),
+        TIMESHEETS, job_no=job_no,
+    )
+
+
+@app.get("/job-hours/{job_no}/export")
+def export_job_hours(
+    job_no: str,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+):
+    """
+    Streams the job-hours report (one row per employee plus TOTAL).
+    """
+    return _export_response(format, JOB_HOURS_FIELDS, job_hours_rows(job_no, start, end), f"job_hours_{job_no}")
+
+
+def _job_hours_report(db: Session, job_no: str):
     """
     Per-employee hours & values for a job number.
     Rules:
@@ -473,147 +720,263 @@ def job_hours_by_job(job_no: str, db: Session = Depends(get_db)):
     """
     rows = (
         db.query(
-            Timesheet.date.label("ts_date"),
-            Timesheet.job_no.label("job_no"),
-            TimesheetEntry.employee_emp_no.label("emp_no"),
-            TimesheetEntry.total_hours.label("hours"),
-            Employee.name.label("name"),
-            Employee.base_pay.label("base_pay"),
-            Employee.OT.label("ot_flag"),
+            DailyHours.date.label("ts_date"),
+            DailyHours.job_no.label("job_no"),
+            DailyHours.emp_no.label("emp_no"),
+            DailyHours.hours.label("hours"),
         )
-        .join(Timesheet, Timesheet.id == TimesheetEntry.timesheet_id)
-        .join(Employee, Employee.emp_no == TimesheetEntry.employee_emp_no)
-        .filter(Timesheet.job_no == job_no)
+        .filter(DailyHours.job_no == job_no)
+        .order_by(DailyHours.emp_no, DailyHours.date)
         .all()
     )
 
-    # Sum hours per employee per day first
-    per_emp_day = {}   # (emp_no, date_str) -> total_hrs
-    emp_info = {}      # emp_no -> {name, base_pay, ot_flag}
+    # Employee x day matrix over the job's active dates, priced in one kernel call
+    known = refdata.employees(db)
+    emp_info = {}
     for r in rows:
-        date_str = r.ts_date.isoformat()
-        key = (r.emp_no, date_str)
-        per_emp_day[key] = per_emp_day.get(key, 0.0) + float(r.hours or 0.0)
-        emp_info.setdefault(r.emp_no, {
-            "name": r.name,
-            "base_pay": float(r.base_pay or 0.0),
-            "ot_flag": (r.ot_flag or "NO"),
-        })
-
-    # Roll up to employee level with your rules
+        if r.emp_no in known:
+            emp_info.setdefault(r.emp_no, known[r.emp_no])
     result = []
-    totals = {
-        "total_hours": 0.0, "reg_hours": 0.0, "not_hours": 0.0, "hot_hours": 0.0,
-        "reg_value": 0.0, "ot_value": 0.0, "total_value": 0.0
+    if emp_info:
+        matrix = HoursMatrix(list(emp_info), min(r.ts_date for r in rows), max(r.ts_date for r in rows))
+        matrix.fill((r.emp_no, r.ts_date, float(r.hours or 0.0)) for r in rows)
+        values = matrix.compute(
+            [i.base_pay for i in emp_info.values()],
+            [(i.OT or "NO") == "YES" for i in emp_info.values()],
+        )
+        for idx, (emp_no, info) in enumerate(emp_info.items()):
+            result.append(job_row(job_no, emp_no, info.name, {k: float(v[idx]) for k, v in values.items()}))
+        totals = {k: float(v.sum()) for k, v in values.items()}
+    else:
+        totals = dict.fromkeys(VALUE_FIELDS, 0.0)
+
+    # TOTAL row
+    result.append(job_row(job_no, "TOTAL", "", totals))
+    return result
+
+@app.get("/job-costing")
+def job_costing(
+    request: Request,
+    start: date = Query(...),
+    end: date = Query(...),
+    job_no: Optional[List[str]] = Query(None, description="Jobs to cost; all jobs with hours in the range if omitted"),
+    db: Session = Depends(get_db),
+):
+    """
+    Per-job, per-employee REG/NOT/HOT hours and values for a period, for many
+    jobs in one request. Same rules as /job-hours, restricted to [start, end].
+    """
+    _ensure_range(start, end)
+    jobs = sorted(set(job_no)) if job_no else None
+    return cached_json(
+        request, db, ("job_costing", start, end, tuple(jobs) if jobs else None),
+        lambda: _job_costing_report(db, start, end, jobs),
+        TIMESHEETS, start=start, end=end,
+    )
+
+
+def _job_costing_report(db: Session, start: date, end: date, jobs: Optional[List[str]]):
+    frozen = load_snapshot(db, whole_month(start, end), "job_costing")
+    if frozen is not None:
+        return _filter_job_costing(frozen, jobs)
+
+    # One pass over the rollup: (job_no, emp_no, day) rows via ix_daily_hours_job_date / _date_emp
+    q = (
+        db.query(
+            DailyHours.job_no,
+            DailyHours.emp_no,
+            DailyHours.date,
+            DailyHours.hours,
+        )
+        .filter(DailyHours.date >= start, DailyHours.date <= end)
+    )
+    if jobs:
+        q = q.filter(DailyHours.job_no.in_(jobs))
+    rows = q.all()
+
+    # Each (job_no, emp_no) pair is one matrix row, so OT splits stay per job-day as in /job-hours
+    known = refdata.employees(db)
+    pairs = {}
+    for r in rows:
+        if r.emp_no in known:
+            pairs.setdefault((r.job_no, r.emp_no), known[r.emp_no])
+    matrix = HoursMatrix(list(pairs), start, end)
+    matrix.fill(((r.job_no, r.emp_no), r.date, float(r.hours or 0.0)) for r in rows)
+    values = matrix.compute(
+        [e.base_pay for e in pairs.values()],
+        [(e.OT or "NO") == "YES" for e in pairs.values()],
+    )
+
+    by_job = {}
+    for idx, ((job, emp_no), info) in enumerate(pairs.items()):
+        rec = {k: float(v[idx]) for k, v in values.items()}
+        job_out = by_job.setdefault(job, {"job_no": job, "employees": [], "_totals": dict.fromkeys(VALUE_FIELDS, 0.0)})
+        job_out["employees"].append(job_row(job, emp_no, info.name, rec))
+        for k in VALUE_FIELDS:
+            job_out["_totals"][k] += rec[k]
+
+    grand = dict.fromkeys(VALUE_FIELDS, 0.0)
+    out_jobs = []
+    for job in sorted(by_job):
+        job_out = by_job[job]
+        totals = job_out.pop("_totals")
+        job_out["employees"].sort(key=lambda r: r["emp_no"])
+        job_out["total"] = job_row(job, "TOTAL", "", totals)
+        out_jobs.append(job_out)
+        for k in VALUE_FIELDS:
+            grand[k] += totals[k]
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "jobs": out_jobs,
+        "total": job_row("", "TOTAL", "", grand),
     }
 
-    per_emp = {}  # emp_no -> accumulators
-    for (emp_no, date_str), hrs in per_emp_day.items():
-        info = emp_info[emp_no]
-        rec = per_emp.setdefault(emp_no, {
-            "emp_no": emp_no,
-            "name": info["name"],
-            "base_pay": info["base_pay"],
-            "ot_flag": info["ot_flag"],
-            "total_hours": 0.0,
-            "reg_hours": 0.0,
-            "not_hours": 0.0,
-            "hot_hours": 0.0,
-            "reg_value": 0.0,  # money
-        })
+def _filter_job_costing(report: dict, jobs: Optional[List[str]]):
+    if not jobs:
+        return report
+    # Subset of a frozen report; the grand total is re-summed from the kept jobs
+    kept = [j for j in report["jobs"] if j["job_no"] in jobs]
+    fields = [k for k in report["total"] if k not in ("job_no", "emp_no", "name")]
+    total = {**report["total"], **{k: round(sum(j["total"][k] for j in kept), 2) for k in fields}}
+    return {**report, "jobs": kept, "total": total}
 
-        rec["total_hours"] += hrs
-        dt = datetime.strptime(date_str, "%Y-%m-%d")
+def _emp_sort_key(emp_no: str):
+    digits = "".join(ch for ch in emp_no or "" if ch.isdigit())
+    return (int(digits) if digits else 0, emp_no)
 
-        if dt.weekday() == 6:  # Sunday => all HOT
-            hot = hrs
-            not_ = 0.0
-            reg = 0.0
-        else:
-            hot = 0.0
-            not_ = max(0.0, hrs - 8.0)
-            reg = max(0.0, hrs - not_)
-
-        rec["hot_hours"] += hot
-        rec["not_hours"] += not_
-        rec["reg_hours"] += reg
-
-        # Regular value uses base/day-of-month for that date
-        dim = days_in_month(dt)
-        day_rate = (rec["base_pay"] / dim) if dim else 0.0
-        rec["reg_value"] += (reg / 8.0) * day_rate
-
-    # Compute OT money and totals per employee
-    for emp_no, rec in per_emp.items():
-        hourly = rec["base_pay"] / 240.0 if rec["base_pay"] else 0.0
-        if rec["ot_flag"] == "YES":
-            ot_value = rec["not_hours"] * (hourly * 1.25) + rec["hot_hours"] * (hourly * 1.5)
-        else:
-            ot_value = 0.0
-
-        total_value = rec["reg_value"] + ot_value
-
-        out = {
-            "job_no": job_no,
-            "emp_no": rec["emp_no"],
-            "name": rec["name"],
-            "total_hours": round(rec["total_hours"], 2),
-            "reg_hours": round(rec["reg_hours"], 2),
-            "not_hours": round(rec["not_hours"], 2),
-            "hot_hours": round(rec["hot_hours"], 2),
-            "base_value": round(rec["reg_value"], 2),
-            "ot_value": round(ot_value, 2),
-            "total_value": round(total_value, 2),
-        }
-        result.append(out)
 
-        # grand totals
-        totals["total_hours"] += rec["total_hours"]
-        totals["reg_hours"]   += rec["reg_hours"]
-        totals["not_hours"]   += rec["not_hours"]
-        totals["hot_hours"]   += rec["hot_hours"]
-        totals["reg_value"]   += rec["reg_value"]
-        totals["ot_value"]    += ot_value
-        totals["total_value"] += total_value
+@app.get("/payroll/salary-sheet")
+def salary_sheet(month: int = Query(..., ge=1, le=12), year: int = Query(...), db: Session = Depends(get_db)):
+    """
+    Finished salary rows for a month, one per employee.
+      - OT hours come from the 15th-to-15th window ending in this month
+      - absences are all non-P days in the calendar month; ML days are not deducted
+      - ADV is the month's PAYMENT rows from advance_txns
+    Closed months are served from their snapshot.
+    """
+    frozen = load_snapshot(db, f"{year:04d}-{month:02d}", "salary_sheet")
+    if frozen is not None:
+        return frozen
+    return _salary_sheet_rows(db, year, month)
 
-    # TOTAL row
-    result.append({
-        "job_no": job_no,
-        "emp_no": "TOTAL",
-        "name": "",
-        "total_hours": round(totals["total_hours"], 2),
-        "reg_hours": round(totals["reg_hours"], 2),
-        "not_hours": round(totals["not_hours"], 2),
-        "hot_hours": round(totals["hot_hours"], 2),
-        "base_value": round(totals["reg_value"], 2),
-        "ot_value": round(totals["ot_value"], 2),
-        "total_value": round(totals["total_value"], 2),
-    })
-    return result
+
+@app.get("/payroll/periods")
+def list_payroll_periods(db: Session = Depends(get_db)):
+    rows = db.query(PayrollPeriod.ym, PayrollPeriod.closed_at, PayrollPeriod.closed_by).order_by(PayrollPeriod.ym).all()
+    return [{"ym": r.ym, "closed_at": r.closed_at, "closed_by": r.closed_by} for r in rows]
+
+
+@app.post("/payroll/periods/{ym}/close")
+def close_payroll_period(ym: str, closed_by: Optional[str] = Query(None), db: Session = Depends(get_db)):
+    """
+    Freeze a month: compute its summary, job costing and salary sheet once and
+    store them. Later reads of the month come from the snapshot and timesheet,
+    attendance and advance writes dated in it are rejected.
+    """
+    try:
+        month_start, month_end = month_bounds(ym)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ym must be YYYY-MM")
+    if month_end >= date.today():
+        # Closing a month in progress would freeze partial data
+        raise HTTPException(status_code=400, detail=f"Cannot close {ym} before it has ended")
+
+    period = store_snapshot(db, ym, {
+        "summary": _summary_report(db, month_start, month_end, sparse=True),
+        "job_costing": _job_costing_report(db, month_start, month_end, None),
+        "salary_sheet": _salary_sheet_rows(db, month_start.year, month_start.month),
+    }, closed_by)
+    return {"message": f"Payroll period {ym} closed", "ym": ym, "closed_at": period.closed_at}
+
+
+def _salary_sheet_rows(db: Session, year: int, month: int):
+    dim = monthrange(year, month)[1]
+    month_start, month_end = date(year, month, 1), date(year, month, dim)
+    ot_start, ot_end = _ot_window(month, year)
+    ym = month_start.strftime("%Y-%m")
+
+    # 1. Employees and pay components, from the reference-data cache
+    employees = sorted(refdata.employees(db).values(), key=lambda e: _emp_sort_key(e.emp_no))
+
+    # 2. NOT/HOT hours over the OT window, via the payroll kernel
+    hour_rows = (
+        db.query(DailyHours.emp_no, DailyHours.date, func.sum(DailyHours.hours))
+        .filter(DailyHours.date >= ot_start, DailyHours.date <= ot_end)
+        .group_by(DailyHours.emp_no, DailyHours.date)
+        .all()
+    )
+    matrix = HoursMatrix([e.emp_no for e in employees], ot_start, ot_end)
+    matrix.fill((emp_no, d, float(h or 0)) for emp_no, d, h in hour_rows)
+    ot = matrix.compute([e.base_pay for e in employees], [True] * len(employees))
+
+    # 3. Absence days in the calendar month
+    absences = defaultdict(list)
+    for emp_no, att_date, status in (
+        db.query(Attendance.emp_no, Attendance.att_date, Attendance.status)
+        .filter(Attendance.att_date >= month_start, Attendance.att_date <= month_end)
+        .filter(func.upper(func.trim(Attendance.status)) != "P")
+        .order_by(Attendance.emp_no, Attendance.att_date)
+        .all()
+    ):
+        absences[emp_no].append({"date": att_date.isoformat(), "status": (status or "").strip().upper()})
+
+    # 4. This month's advance deductions
+    adv = dict(
+        db.query(AdvanceTxn.emp_no, func.sum(AdvanceTxn.amount))
+        .filter(AdvanceTxn.ym == ym, AdvanceTxn.type == AdvanceType.PAYMENT)
+        .group_by(AdvanceTxn.emp_no)
+        .all()
+    )
+
+    rows = []
+    for i, e in enumerate(employees):
+        basic = e.base_pay
+        allowances = [e.food_all, e.ws_allowance, e.hra, e.spl_allown, e.fixed_ot]
+        dates = absences.get(e.emp_no, [])
+        deducted_days = sum(1 for d in dates if d["status"] != "ML")
+        basic_earned = basic / dim * max(0, dim - deducted_days)
+        ot_amount = float(ot["ot_value"][i])
+        gross = basic_earned + sum(allowances) + ot_amount
+        advance = float(adv.get(e.emp_no) or 0)
+
+        rows.append({
+            "emp_no": e.emp_no,
+            "name": e.name,
+            "DOJ": e.DOJ.isoformat() if e.DOJ else None,
+            "basic": round(basic, 2),
+            "food_all": round(allowances[0], 2),
+            "ws_allowance": round(allowances[1], 2),
+            "hra": round(allowances[2], 2),
+            "spl_allown": round(allowances[3], 2),
+            "fixed_ot": round(allowances[4], 2),
+            "total_salary": round(basic + sum(allowances), 2),
+            "absent_days": len(dates),
+            "deducted_absent_days": deducted_days,
+            "absence_dates": dates,
+            "absence_deduction": round(basic / dim * deducted_days, 2),
+            "basic_earned": round(basic_earned, 2),
+            "not_hours": round(float(ot["not_hours"][i]), 2),
+            "hot_hours": round(float(ot["hot_hours"][i]), 2),
+            "ot_amount": round(ot_amount, 2),
+            "gross_salary": round(gross, 2),
+            "adv": round(advance, 2),
+            "net_salary": round(gross + advance, 2),
+        })
+
+    return {
+        "month": ym,
+        "days_in_month": dim,
+        "ot_window": {"start": ot_start.isoformat(), "end": ot_end.isoformat()},
+        "rows": rows,
+    }
 
 # ======== Utility ========
 
 def insert_payment_for_month(db: Session, emp_no: str, ts: date):
-    acc = db.query(AdvanceAccount).filter_by(emp_no=emp_no).first()
-    if not acc or acc.advance <= 0:
-        return
-    ym_str = ts.strftime("%Y-%m")
-    existing = db.query(AdvanceTxn).filter(
-        AdvanceTxn.emp_no == emp_no,
-        AdvanceTxn.ym == ym_str,
-        AdvanceTxn.type == AdvanceType.PAYMENT
-    ).first()
-    if existing:
-        return
-    amount = -min(acc.advance, acc.monthly_installment)
-    txn = AdvanceTxn(
-        emp_no=emp_no,
-        ts=ts,
-        type=AdvanceType.PAYMENT,
-        amount=amount,
-        note="Auto monthly deduction"
-    )
-    db.add(txn)
+    # Same path as the monthly run; the caller commits
+    insert_month_payments(db, ts.strftime("%Y-%m"), ts, [emp_no])
 
 
 # ====================== ADVANCES API ======================
@@ -623,20 +986,30 @@ def _current_ym() -> str:
 def _ym_to_ts(ym: str) -> date:
     return date.fromisoformat(f"{ym}-01")
 
+def _commit_advance(db: Session):
+    # The account lock serialises writers; this catches anything that still
+    # trips the one-PAYMENT-per-month key
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A payment for this month was written concurrently; retry")
+
+def _month_payment(db: Session, emp_no: str, ym: str) -> Optional[AdvanceTxn]:
+    return db.query(AdvanceTxn).filter(
+        and_(
+            AdvanceTxn.emp_no == emp_no,
+            AdvanceTxn.ym == ym,
+            AdvanceTxn.type == AdvanceType.PAYMENT
+        )
+    ).with_for_update().first()
+
 
 @app.post("/advances", response_model=AdvanceCreateOut)
 def add_advance(data: AdvanceCreateIn, db: Session = Depends(get_db)):
-    acc = db.query(AdvanceAccount).filter_by(emp_no=data.emp_no).first()
-    if not acc:
-        acc = AdvanceAccount(
-            emp_no=data.emp_no,
-            advance=0,
-            monthly_installment=data.monthly_installment
-        )
-        db.add(acc)
-        db.flush()
-    else:
-        acc.monthly_installment = data.monthly_installment
+    acc = lock_or_create_account(db, data.emp_no, data.monthly_installment)
+    ensure_dates_open(db, [data.ts])
+    acc.monthly_installment = data.monthly_installment
 
     # Insert ADVANCE
     db.add(AdvanceTxn(
@@ -655,13 +1028,7 @@ def add_advance(data: AdvanceCreateIn, db: Session = Depends(get_db)):
     ym_str = data.ts.strftime("%Y-%m")
 
     # Upsert a PAYMENT for that month, but never overpay
-    payment_exists = db.query(AdvanceTxn).filter(
-        and_(
-            AdvanceTxn.emp_no == data.emp_no,
-            AdvanceTxn.ym == ym_str,
-            AdvanceTxn.type == AdvanceType.PAYMENT
-        )
-    ).first()
+    payment_exists = _month_payment(db, data.emp_no, ym_str)
 
     payment_inserted = False
     if not payment_exists and fresh_balance > 0:
@@ -675,7 +1042,7 @@ def add_advance(data: AdvanceCreateIn, db: Session = Depends(get_db)):
         ))
         payment_inserted = True
 
-    db.commit()
+    _commit_advance(db)
 
     # Final balance to return
     final_balance = db.query(AdvanceAccount.advance).filter_by(emp_no=data.emp_no).scalar() or 0.0
@@ -692,9 +1059,10 @@ def add_advance(data: AdvanceCreateIn, db: Session = Depends(get_db)):
 
 @app.put("/payments/{emp_no}/{ym}", response_model=PaymentUpdateOut)
 def update_or_defer_payment(emp_no: str, ym: str, body: PaymentUpdateIn, db: Session = Depends(get_db)):
-    acc = db.query(AdvanceAccount).filter_by(emp_no=emp_no).first()
+    acc = lock_account(db, emp_no)
     if not acc:
         raise HTTPException(status_code=404, detail="Employee account not found")
+    ensure_open(db, [ym])
 
     # Reject overpayment: |amount| cannot exceed balance
     balance_now = Decimal(str(acc.advance or 0))
@@ -706,13 +1074,7 @@ def update_or_defer_payment(emp_no: str, ym: str, body: PaymentUpdateIn, db: Ses
         )
 
     created = False
-    payment_txn = db.query(AdvanceTxn).filter(
-        and_(
-            AdvanceTxn.emp_no == emp_no,
-            AdvanceTxn.ym == ym,
-            AdvanceTxn.type == AdvanceType.PAYMENT
-        )
-    ).order_by(AdvanceTxn.ts.desc(), AdvanceTxn.id.desc()).first()
+    payment_txn = _month_payment(db, emp_no, ym)
 
     if payment_txn:
         payment_txn.amount = float(proposed)
@@ -750,7 +1112,7 @@ def update_or_defer_payment(emp_no: str, ym: str, body: PaymentUpdateIn, db: Ses
                 note="Deferred (audit)"
             ))
 
-    db.commit()
+    _commit_advance(db)
 
     new_balance = db.query(AdvanceAccount.advance).filter_by(emp_no=emp_no).scalar() or 0.0
 
@@ -766,11 +1128,12 @@ def update_or_defer_payment(emp_no: str, ym: str, body: PaymentUpdateIn, db: Ses
 
 @app.post("/advances/increase", response_model=IncreaseAdvanceOut)
 def increase_advance(body: IncreaseAdvanceIn, db: Session = Depends(get_db)):
-    acc = db.query(AdvanceAccount).filter_by(emp_no=body.emp_no).first()
+    acc = lock_account(db, body.emp_no)
     if not acc:
         raise HTTPException(404, "Employee account not found")
     if body.amount <= 0:
         raise HTTPException(400, "Increase amount must be > 0")
+    ensure_dates_open(db, [body.ts])
 
     db.add(AdvanceTxn(
         emp_no=body.emp_no,
@@ -779,7 +1142,7 @@ def increase_advance(body: IncreaseAdvanceIn, db: Session = Depends(get_db)):
         amount=body.amount,
         note=body.note
     ))
-    db.commit()
+    _commit_advance(db)
 
     new_balance = db.query(AdvanceAccount.advance).filter_by(emp_no=body.emp_no).scalar() or 0.0
 
@@ -793,7 +1156,7 @@ def increase_advance(body: IncreaseAdvanceIn, db: Session = Depends(get_db)):
 
 @app.put("/advances/{emp_no}/installment", response_model=InstallmentUpdateOut)
 def update_installment(emp_no: str, body: InstallmentUpdateIn, db: Session = Depends(get_db)):
-    acc = db.query(AdvanceAccount).filter_by(emp_no=emp_no).first()
+    acc = lock_account(db, emp_no)
     if not acc:
         raise HTTPException(404, "Employee account not found")
 
@@ -803,6 +1166,7 @@ def update_installment(emp_no: str, body: InstallmentUpdateIn, db: Session = Dep
     payment_adjusted = False
 
     if body.apply_to_month:
+        ensure_open(db, [ym])
         # If there's a DEFER for that month, don't change the payment row
         defer_exists = db.query(AdvanceTxn).filter(
             and_(
@@ -813,13 +1177,7 @@ def update_installment(emp_no: str, body: InstallmentUpdateIn, db: Session = Dep
         ).first()
 
         if not defer_exists:
-            payment_txn = db.query(AdvanceTxn).filter(
-                and_(
-                    AdvanceTxn.emp_no == emp_no,
-                    AdvanceTxn.ym == ym,
-                    AdvanceTxn.type == AdvanceType.PAYMENT
-                )
-            ).order_by(AdvanceTxn.ts.desc(), AdvanceTxn.id.desc()).first()
+            payment_txn = _month_payment(db, emp_no, ym)
 
             # Guard: new payment amount must not exceed balance
             balance_now = Decimal(str(acc.advance or 0))
@@ -847,7 +1205,7 @@ def update_installment(emp_no: str, body: InstallmentUpdateIn, db: Session = Dep
                 ))
                 payment_adjusted = True
 
-    db.commit()
+    _commit_advance(db)
 
     new_balance = db.query(AdvanceAccount.advance).filter_by(emp_no=emp_no).scalar() or 0.0
 
@@ -862,14 +1220,43 @@ def update_installment(emp_no: str, body: InstallmentUpdateIn, db: Session = Dep
 
 
 @app.get("/advances/{emp_no}/balance", response_model=BalanceOut)
-def get_advance_balance(emp_no: str, db: Session = Depends(get_db)):
+def get_advance_balance(
+    emp_no: str,
+    as_of: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="YYYY-MM; balance at the end of that month"),
+    db: Session = Depends(get_db),
+):
     acc = db.query(AdvanceAccount).filter_by(emp_no=emp_no).first()
     if not acc:
         raise HTTPException(status_code=404, detail="Employee account not found")
-    return BalanceOut(emp_no=emp_no, balance=float(acc.advance or 0.0))
+    balance = balance_as_of(db, emp_no, as_of) if as_of else acc.advance
+    return BalanceOut(emp_no=emp_no, balance=float(balance or 0.0),
+                      monthly_installment=float(acc.monthly_installment or 0.0))
+
+
+@app.get("/advances/{emp_no}/ledger")
+def get_advance_ledger(
+    emp_no: str,
+    ym: str = Query(..., pattern=r"^\d{4}-\d{2}$"),
+    db: Session = Depends(get_db),
+):
+    """
+    One month of an employee's advance ledger: opening balance, transactions
+    with running balance, closing balance.
+    """
+    return month_ledger(db, emp_no, ym)
 
 @app.on_event("startup")
 def _on_startup():
+    db = SessionLocal()
+    try:
+        # Backfills are not run here: every worker would start one at once.
+        # They run from the CLI or the /cron endpoints, once per deployment.
+        if rollup_needs_backfill(db):
+            logger.warning("daily_hours is empty; run `python rollup.py` or POST /cron/rebuild-daily-hours")
+        if checkpoints_need_backfill(db):
+            logger.warning("advance_checkpoints is empty; run `python ledger.py` or POST /cron/rebuild-advance-checkpoints")
+    finally:
+        db.close()
     start_scheduler()
 
 @app.on_event("shutdown")
@@ -879,10 +1266,87 @@ def _on_shutdown():
 # Optional: manual trigger for testing from Postman
 @app.post("/cron/run-auto-payments")
 def cron_run_now():
-    inserted = run_monthly_auto_deductions()
-    return {"message": "Auto deductions executed", "inserted": inserted}
+    report = run_monthly_auto_deductions()
+    return {"message": "Auto deductions executed", **report}
+
+
+@app.post("/cron/rebuild-daily-hours")
+def cron_rebuild_daily_hours(start: Optional[date] = Query(None), end: Optional[date] = Query(None), db: Session = Depends(get_db)):
+    """
+    Backfill / repair the daily_hours rollup, optionally for a date range only.
+    """
+    rows = rebuild_daily_hours(db, start, end)
+    return {"message": "daily_hours rebuilt", "rows": rows}
+
+
+@app.post("/cron/rebuild-advance-checkpoints")
+def cron_rebuild_advance_checkpoints(db: Session = Depends(get_db)):
+    """
+    Regenerate advance_checkpoints from advance_txns (after direct SQL edits).
+    """
+    return {"message": "advance_checkpoints rebuilt", "rows": rebuild_checkpoints(db)}
+
 
 
+ADVANCE_HISTORY_PAGE_MAX = 500
+
+
+@app.get("/advances/history")
+def get_advance_history_batch(
+    emp_no: Optional[List[str]] = Query(None, description="Employees to include; all with transactions if omitted"),
+    from_ym: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    to_ym: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    limit: int = Query(50, ge=1, le=ADVANCE_HISTORY_PAGE_MAX, description="Transactions per employee"),
+    cursor: Optional[List[str]] = Query(None, description="next_cursor values from a previous page"),
+    db: Session = Depends(get_db),
+):
+    """
+    Advance history for many employees in one call, newest first, grouped
+    per employee with a per-employee next_cursor. Pass the non-null cursors
+    to continue; that page returns only the employees they belong to.
+    """
+    try:
+        cursors = [parse_history_cursor(c) for c in cursor or []]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    emp_nos = sorted(set(emp_no)) if emp_no else None
+    return json_response({"groups": batch_history(db, emp_nos, from_ym, to_ym, limit, cursors)})
+
+
+@app.get("/advances/statements")
+def advance_statements(
+    ym: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    from_ym: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    to_ym: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    format: str = Query("json", pattern="^(json|csv|ndjson)$"),
+):
+    """
+    Opening balance, advances, increases, payments, deferrals and closing
+    balance per account per month, for one ym or a from_ym..to_ym range.
+    csv/ndjson stream the rows.
+    """
+    from_ym, to_ym = (ym, ym) if ym else (from_ym, to_ym)
+    if not (from_ym and to_ym) or from_ym > to_ym:
+        raise HTTPException(status_code=400, detail="Pass ym, or from_ym <= to_ym")
+    rows = advance_statement_rows(from_ym, to_ym)
+    if format == "json":
+        return json_response(list(rows))
+    return _export_response(format, STATEMENT_FIELDS, rows, f"advance_statements_{from_ym}_{to_ym}")
+
+
+@app.get("/advances/projection")
+def advance_projection(
+    from_ym: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="First projected month; defaults to this month"),
+    months: int = Query(DEFAULT_HORIZON, ge=1, le=MAX_HORIZON),
+    db: Session = Depends(get_db),
+):
+    """
+    Payoff schedule for all advance accounts: deduction load per future month
+    and the month each account is cleared. Booked DEFER/PAYMENT rows and
+    future-dated advances are honoured; other months deduct the installment.
+    """
+    return json_response(project_payoff(db, from_ym or _current_ym(), months))
+
 
 @app.get("/advances/{emp_no}/history")
 def get_advance_history(emp_no: str, db: Session = Depends(get_db)):
@@ -914,18 +1378,11 @@ def get_all_advance_balances(db: Session = Depends(get_db)):
     Retrieves the advance balance and monthly installment
     for all employees who have an account.
     """
-    all_accounts = db.query(AdvanceAccount).all()
-
-    balances_list = []
-    for acc in all_accounts:
-        balances_list.append(
-            BalanceOut(
-                emp_no=acc.emp_no,
-                balance=float(acc.advance or 0.0),
-                monthly_installment=float(acc.monthly_installment or 0.0)
-            )
-        )
-
-    return balances_list
+    rows = db.query(
+        AdvanceAccount.emp_no,
+        func.coalesce(AdvanceAccount.advance, 0),
+        func.coalesce(AdvanceAccount.monthly_installment, 0),
+    ).all()
+    return rows_response(["emp_no", "balance", "monthly_installment"], rows, floats=["balance", "monthly_installment"])
 
 
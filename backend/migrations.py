@@ -0,0 +1,80 @@
+# migrations.py
+import logging
+from sqlalchemy import func, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+from database import Base
+
+logger = logging.getLogger(__name__)
+
+# Offending keys listed when a unique index cannot be created
+DUPLICATE_REPORT_LIMIT = 50
+
+
+def ensure_generated_columns(engine: Engine) -> list:
+    """
+    Adds generated (Computed) columns declared on models that existing tables
+    are missing; plain columns are left to hand-written migrations. Returns
+    "table.column" for each one added.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        have = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.computed is None or column.name in have:
+                continue
+            # Compiled for the driver's paramstyle, so sent as-is
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _duplicate_keys(engine: Engine, index) -> list:
+    cols = list(index.columns)
+    q = (
+        select(*cols, func.count().label("rows"))
+        .where(*(c.isnot(None) for c in cols))
+        .group_by(*cols)
+        .having(func.count() > 1)
+        .limit(DUPLICATE_REPORT_LIMIT)
+    )
+    with engine.connect() as conn:
+        return conn.execute(q).all()
+
+
+def ensure_indexes(engine: Engine) -> list:
+    """
+    create_all() only creates missing tables; this adds indexes declared on
+    models that existing tables are missing. Returns the names created.
+    A unique index the existing rows violate (e.g. two PAYMENT rows for one
+    employee and month) stops startup: the offending keys are logged and
+    must be fixed by hand, as the app relies on the guarantee.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        have = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in have:
+                continue
+            if index.unique:
+                duplicates = _duplicate_keys(engine, index)
+                if duplicates:
+                    for row in duplicates:
+                        logger.error("%s: duplicate key %s", index.name, tuple(row))
+                    raise RuntimeError(
+                        f"Cannot create unique index {index.name}: existing rows in {table.name} "
+                        f"violate it (first {len(duplicates)} keys logged)"
+                    )
+            index.create(bind=engine)
+            created.append(index.name)
+    return created
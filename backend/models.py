@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Time, DECIMAL, ForeignKey, Text, Enum, UniqueConstraint, func, DateTime, Computed, Numeric, Index
+from sqlalchemy import Column, Integer, String, Date, Time, DECIMAL, ForeignKey, Text, Enum, UniqueConstraint, func, DateTime, Computed, Numeric, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -35,6 +35,18 @@ class Timesheet(Base):
     authorized_by = Column(String(100))
     for_company = Column(String(100))
 
+    __table_args__ = (
+        Index("ix_timesheets_job_date", "job_no", "date"),
+        Index("ix_timesheets_date", "date"),
+    )
+
+    entries = relationship(
+        "TimesheetEntry",
+        back_populates="timesheet",
+        order_by="TimesheetEntry.id",
+        passive_deletes=True,
+    )
+
 class TimesheetEntry(Base):
     __tablename__ = "timesheet_entries"
     id = Column(Integer, primary_key=True)
@@ -47,6 +59,40 @@ class TimesheetEntry(Base):
     total_hours = Column(DECIMAL(5, 2))
     remarks = Column(Text)
 
+    timesheet = relationship("Timesheet", back_populates="entries")
+    employee = relationship("Employee")
+    trade = relationship("Trade")
+
+class RefDataVersion(Base):
+    """
+    Shared change counters (versions.py): one per reference table (employees,
+    trades) and per cached report scope (e.g. "timesheets:2025-03"). Bumped
+    in the same transaction as the write they describe.
+    """
+    __tablename__ = "ref_data_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class DailyHours(Base):
+    """
+    Rollup of timesheet_entries per (emp_no, date, job_no), kept in step with
+    every timesheet write. job_no is '' for sheets without a job number.
+    """
+    __tablename__ = "daily_hours"
+
+    emp_no = Column(String(20), ForeignKey("employees.emp_no"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    job_no = Column(String(50), primary_key=True, default="")
+    hours = Column(DECIMAL(7, 2), nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+    timesheet_ids = Column(Text)  # comma-separated
+
+    __table_args__ = (
+        Index("ix_daily_hours_date_emp", "date", "emp_no"),
+        Index("ix_daily_hours_job_date", "job_no", "date"),
+    )
+
 class Attendance(Base):
     __tablename__ = "attendance"
 
@@ -59,6 +105,11 @@ class Attendance(Base):
 
     employee = relationship("Employee", backref="attendance_records")
 
+    __table_args__ = (
+        # Date-range scans across all employees; covers emp_no/status too
+        Index("ix_attendance_date_emp", "att_date", "emp_no", "status"),
+    )
+
 class AdvanceType(enum.Enum):
     ADVANCE = "advance"
     INCREASE = "increase"
@@ -90,6 +141,8 @@ class AdvanceTxn(Base):
     emp_no = Column(String(20), ForeignKey("advance_accounts.emp_no", onupdate="CASCADE", ondelete="CASCADE"), nullable=False)
     ts = Column(Date, nullable=False)  # transaction date
     ym = Column(String(7), Computed("DATE_FORMAT(ts, '%Y-%m')", persisted=True))
+    # ym for PAYMENT rows, NULL otherwise: backs the one-payment-per-month unique key
+    payment_ym = Column(String(7), Computed("CASE WHEN type = 'payment' THEN DATE_FORMAT(ts, '%Y-%m') END", persisted=True))
     
     type = Column(
         Enum(
@@ -111,7 +164,43 @@ class AdvanceTxn(Base):
         Index("ix_adv_txns_emp", "emp_no"),
         Index("ix_adv_txns_emp_ym", "emp_no", "ym"),
         Index("ix_adv_txns_ym_type", "ym", "type"),
+        Index("ux_adv_txns_emp_payment_ym", "emp_no", "payment_ym", unique=True),
     )
 
     def __repr__(self):
         return f"<AdvanceTxn(emp_no={self.emp_no}, type={self.type}, amount={self.amount}, ts={self.ts})>"
+
+class AdvanceCheckpoint(Base):
+    """
+    Per-employee month balances derived from advance_txns: opening and
+    closing balance for each month that has transactions. Kept in step by
+    ledger.py whenever transactions are written.
+    """
+    __tablename__ = "advance_checkpoints"
+
+    emp_no = Column(String(20), primary_key=True)
+    ym = Column(String(7), primary_key=True)  # 'YYYY-MM'
+    opening = Column(Numeric(12, 2), nullable=False, default=0)
+    closing = Column(Numeric(12, 2), nullable=False, default=0)
+    txn_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<AdvanceCheckpoint(emp_no={self.emp_no}, ym={self.ym}, opening={self.opening}, closing={self.closing})>"
+
+class PayrollPeriod(Base):
+    """
+    A closed (paid) month. Holds the month's reports as zlib-compressed JSON,
+    computed once at close; timesheet, attendance and advance writes dated in
+    a closed month are rejected.
+    """
+    __tablename__ = "payroll_periods"
+
+    ym = Column(String(7), primary_key=True)  # 'YYYY-MM'
+    closed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    closed_by = Column(String(100))
+    summary = Column(LargeBinary(length=2**32 - 1), nullable=False)
+    job_costing = Column(LargeBinary(length=2**32 - 1), nullable=False)
+    salary_sheet = Column(LargeBinary(length=2**32 - 1), nullable=False)
+
+    def __repr__(self):
+        return f"<PayrollPeriod(ym={self.ym}, closed_at={self.closed_at})>"
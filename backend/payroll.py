@@ -0,0 +1,121 @@
+# payroll.py
+from datetime import date
+from typing import Iterable, Optional, Sequence, Tuple
+import numpy as np
+
+# Pay rules shared by the summary, job-hours and export endpoints:
+#   - Sunday => all hours are holiday OT (HOT)
+#   - other days => hours above 8 are normal OT (NOT), the rest regular (REG)
+#   - REG value = (REG/8) * (base / days_in_month(date))
+#   - NOT value = NOT * 1.25 * (base/240), HOT value = HOT * 1.5 * (base/240), only when OT == 'YES'
+REGULAR_DAY_HOURS = 8.0
+HOURLY_DIVISOR = 240.0
+NOT_MULTIPLIER = 1.25
+HOT_MULTIPLIER = 1.5
+
+VALUE_FIELDS = ("total_hours", "reg_hours", "not_hours", "hot_hours", "reg_value", "ot_value", "total_value")
+
+
+def day_calendar(start: date, n_days: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (is_sunday, days_in_month) vectors for n_days consecutive days from start.
+    """
+    days = np.datetime64(start, "D") + np.arange(n_days)
+    months = days.astype("datetime64[M]")
+    dim = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.float64)
+    is_sunday = (start.weekday() + np.arange(n_days)) % 7 == 6
+    return is_sunday, dim
+
+
+def payroll_kernel(hours: np.ndarray, start: date, base_pay: np.ndarray, ot_yes: np.ndarray) -> dict:
+    """
+    Vectorised pay rules over an employee x day hours matrix.
+
+    hours:    (E, D) hours per employee per day, day 0 == start
+    base_pay: (E,) monthly base pay
+    ot_yes:   (E,) bool, employee is paid OT
+    Returns a dict of (E,) arrays keyed by VALUE_FIELDS.
+    """
+    hours = np.asarray(hours, dtype=np.float64)
+    base_pay = np.asarray(base_pay, dtype=np.float64)
+    is_sunday, dim = day_calendar(start, hours.shape[1])
+
+    hot = np.where(is_sunday, hours, 0.0)
+    not_ = np.where(is_sunday, 0.0, np.maximum(hours - REGULAR_DAY_HOURS, 0.0))
+    reg = hours - hot - not_
+
+    reg_value = (reg @ (1.0 / dim)) / REGULAR_DAY_HOURS * base_pay
+    not_hours = not_.sum(axis=1)
+    hot_hours = hot.sum(axis=1)
+    hourly = base_pay / HOURLY_DIVISOR
+    ot_value = np.where(
+        ot_yes,
+        not_hours * hourly * NOT_MULTIPLIER + hot_hours * hourly * HOT_MULTIPLIER,
+        0.0,
+    )
+    return {
+        "total_hours": hours.sum(axis=1),
+        "reg_hours": reg.sum(axis=1),
+        "not_hours": not_hours,
+        "hot_hours": hot_hours,
+        "reg_value": reg_value,
+        "ot_value": ot_value,
+        "total_value": reg_value + ot_value,
+    }
+
+
+class HoursMatrix:
+    """
+    Builds the employee x day matrix for payroll_kernel from sparse
+    (emp_no, date, hours) rows.
+    """
+
+    def __init__(self, emp_nos: Sequence[str], start: date, end: date):
+        self.emp_nos = list(emp_nos)
+        self.index = {e: i for i, e in enumerate(self.emp_nos)}
+        self.start = start
+        self.hours = np.zeros((len(self.emp_nos), (end - start).days + 1), dtype=np.float64)
+
+    def fill(self, rows: Iterable[Tuple[str, date, float]]):
+        for emp_no, d, hrs in rows:
+            i = self.index.get(emp_no)
+            if i is not None:
+                self.hours[i, (d - self.start).days] += hrs
+        return self
+
+    def compute(self, base_pay: Optional[Sequence[float]] = None, ot_yes: Optional[Sequence[bool]] = None) -> dict:
+        # Without rates only the hour splits are meaningful
+        n = len(self.emp_nos)
+        base_pay = np.zeros(n) if base_pay is None else np.asarray(base_pay, dtype=np.float64)
+        ot_yes = np.zeros(n, dtype=bool) if ot_yes is None else np.asarray(ot_yes, dtype=bool)
+        return payroll_kernel(self.hours, self.start, base_pay, ot_yes)
+
+
+def employee_values(days: Sequence[Tuple[date, float]], base_pay: float, ot_flag: str) -> dict:
+    """
+    Hours and money for one employee from (date, hours) pairs.
+    """
+    if not days:
+        return dict.fromkeys(VALUE_FIELDS, 0.0)
+    start = min(d for d, _ in days)
+    end = max(d for d, _ in days)
+    out = HoursMatrix([None], start, end).fill((None, d, h) for d, h in days).compute([base_pay], [ot_flag == "YES"])
+    return {k: float(v[0]) for k, v in out.items()}
+
+
+def job_row(job_no: str, emp_no: str, name: str, rec: dict) -> dict:
+    """
+    One output row of the job-hours report, rounded for display.
+    """
+    return {
+        "job_no": job_no,
+        "emp_no": emp_no,
+        "name": name,
+        "total_hours": round(rec["total_hours"], 2),
+        "reg_hours": round(rec["reg_hours"], 2),
+        "not_hours": round(rec["not_hours"], 2),
+        "hot_hours": round(rec["hot_hours"], 2),
+        "base_value": round(rec["reg_value"], 2),
+        "ot_value": round(rec["ot_value"], 2),
+        "total_value": round(rec["total_value"], 2),
+    }
@@ -0,0 +1,85 @@
+# periods.py
+import json
+import zlib
+from calendar import monthrange
+from datetime import date
+from typing import Iterable, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from models import PayrollPeriod
+
+SNAPSHOT_PARTS = ("summary", "job_costing", "salary_sheet")
+
+# Snapshots never change once written, so decoded ones can be kept per process
+_decoded = {}
+
+
+def ym_of(d: date) -> str:
+    return d.strftime("%Y-%m")
+
+
+def month_bounds(ym: str) -> Tuple[date, date]:
+    year, month = int(ym[:4]), int(ym[5:7])
+    return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+
+def whole_month(start: date, end: date) -> Optional[str]:
+    """
+    'YYYY-MM' when [start, end] is exactly one calendar month, else None.
+    Snapshots only serve such requests: sub-ranges, multi-month ranges and
+    exports are computed from the live tables, which writes to closed months
+    cannot change, but which use current employee pay rates.
+    """
+    ym = ym_of(start)
+    return ym if (start, end) == month_bounds(ym) else None
+
+
+def closed_yms(db: Session, yms: Iterable[str]) -> set:
+    yms = set(yms)
+    if not yms:
+        return set()
+    return {r.ym for r in db.query(PayrollPeriod.ym).filter(PayrollPeriod.ym.in_(yms)).all()}
+
+
+def ensure_open(db: Session, yms: Iterable[str]):
+    """
+    409 if any of these months has been closed.
+    """
+    closed = sorted(closed_yms(db, yms))
+    if closed:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Payroll period(s) {', '.join(closed)} closed; changes are not allowed."
+        )
+
+
+def ensure_dates_open(db: Session, dates: Iterable[date]):
+    ensure_open(db, {ym_of(d) for d in dates if d is not None})
+
+
+def _pack(obj) -> bytes:
+    return zlib.compress(json.dumps(obj, separators=(",", ":"), default=str).encode(), 9)
+
+
+def store_snapshot(db: Session, ym: str, parts: dict, closed_by: Optional[str] = None) -> PayrollPeriod:
+    if closed_yms(db, [ym]):
+        raise HTTPException(status_code=409, detail=f"Payroll period {ym} is already closed")
+    period = PayrollPeriod(ym=ym, closed_by=closed_by, **{k: _pack(parts[k]) for k in SNAPSHOT_PARTS})
+    db.add(period)
+    db.commit()
+    return period
+
+
+def load_snapshot(db: Session, ym: Optional[str], part: str):
+    """
+    The decoded snapshot part of a closed month, or None if the month is open.
+    """
+    if ym is None:
+        return None
+    key = (ym, part)
+    if key not in _decoded:
+        blob = db.query(getattr(PayrollPeriod, part)).filter(PayrollPeriod.ym == ym).scalar()
+        if blob is None:
+            return None
+        _decoded[key] = json.loads(zlib.decompress(blob))
+    return _decoded[key]
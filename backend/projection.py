@@ -0,0 +1,148 @@
+# projection.py
+from typing import Dict, List
+import numpy as np
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from exports import month_range
+from models import AdvanceAccount, AdvanceTxn, AdvanceType
+
+# Payoff projection for every advance account at once. Per future month:
+#   - ADVANCE/INCREASE rows already booked for the month are added first
+#   - a month with a PAYMENT row deducts exactly that payment (0 when deferred);
+#     a month with only a DEFER row deducts nothing
+#   - any other month deducts LEAST(balance, monthly_installment), like the monthly run
+DEFAULT_HORIZON = 36
+MAX_HORIZON = 120
+CENTS = 0.005
+
+
+def payoff_kernel(opening: np.ndarray, installment: np.ndarray, added: np.ndarray,
+                  fixed: np.ndarray, fixed_mask: np.ndarray) -> dict:
+    """
+    Vectorised payoff schedule over an account x month grid.
+
+    opening:     (A,) balance before month 0
+    installment: (A,) monthly installment
+    added:       (A, M) advances/increases booked per month
+    fixed:       (A, M) deduction already set per month (positive)
+    fixed_mask:  (A, M) bool, month has a PAYMENT or DEFER row
+    Returns (A, M) "deductions" and closing "balance", and (A,) "payoff"
+    month index (-1 while still outstanding at the end of the horizon).
+    """
+    n_acc, n_months = added.shape
+    bal = np.asarray(opening, dtype=np.float64).copy()
+    installment = np.maximum(np.asarray(installment, dtype=np.float64), 0.0)
+    deductions = np.empty((n_acc, n_months), dtype=np.float64)
+    balance = np.empty((n_acc, n_months), dtype=np.float64)
+    # The recurrence runs month by month; each step is one vector op over all accounts
+    for m in range(n_months):
+        bal += added[:, m]
+        d = np.where(fixed_mask[:, m], fixed[:, m], np.minimum(np.maximum(bal, 0.0), installment))
+        bal -= d
+        deductions[:, m] = d
+        balance[:, m] = bal
+
+    # Paid off in the month after the last month that still closes positive
+    outstanding = balance > CENTS
+    last_positive = n_months - 1 - np.argmax(outstanding[:, ::-1], axis=1)
+    payoff = np.where(outstanding.any(axis=1), last_positive + 1, 0)
+    payoff[payoff >= n_months] = -1
+    return {"deductions": deductions, "balance": balance, "payoff": payoff}
+
+
+def _load(db: Session, months: List[str]):
+    """
+    Accounts with a balance before the horizon or activity in it, and their
+    opening balance, installment and per-month grids.
+    """
+    from_ym, to_ym = months[0], months[-1]
+    opening: Dict[str, float] = dict(
+        db.query(AdvanceTxn.emp_no, func.sum(AdvanceTxn.amount))
+        .filter(AdvanceTxn.ym < from_ym)
+        .group_by(AdvanceTxn.emp_no)
+        .all()
+    )
+    booked = (
+        db.query(
+            AdvanceTxn.emp_no,
+            AdvanceTxn.ym,
+            func.sum(case((AdvanceTxn.type.in_([AdvanceType.ADVANCE, AdvanceType.INCREASE]), AdvanceTxn.amount), else_=0)),
+            func.sum(case((AdvanceTxn.type == AdvanceType.PAYMENT, AdvanceTxn.amount), else_=0)),
+            func.sum(case((AdvanceTxn.type.in_([AdvanceType.PAYMENT, AdvanceType.DEFER]), 1), else_=0)),
+        )
+        .filter(AdvanceTxn.ym >= from_ym, AdvanceTxn.ym <= to_ym)
+        .group_by(AdvanceTxn.emp_no, AdvanceTxn.ym)
+        .all()
+    )
+    active = {e for e, v in opening.items() if v and float(v) > CENTS} | {r[0] for r in booked}
+    accounts = (
+        db.query(AdvanceAccount.emp_no, AdvanceAccount.monthly_installment)
+        .filter(AdvanceAccount.emp_no.in_(active))
+        .order_by(AdvanceAccount.emp_no)
+        .all()
+    ) if active else []
+
+    emp_nos = [e for e, _ in accounts]
+    index = {e: i for i, e in enumerate(emp_nos)}
+    month_index = {ym: j for j, ym in enumerate(months)}
+    shape = (len(emp_nos), len(months))
+    added = np.zeros(shape)
+    fixed = np.zeros(shape)
+    fixed_mask = np.zeros(shape, dtype=bool)
+    for emp_no, ym, adds, paid, n_fixed in booked:
+        i = index.get(emp_no)
+        if i is None:
+            continue
+        j = month_index[ym]
+        added[i, j] = float(adds or 0)
+        fixed[i, j] = -float(paid or 0)
+        fixed_mask[i, j] = bool(n_fixed)
+    opening_arr = np.array([float(opening.get(e) or 0) for e in emp_nos], dtype=np.float64)
+    installment = np.array([float(inst or 0) for _, inst in accounts], dtype=np.float64)
+    return emp_nos, opening_arr, installment, added, fixed, fixed_mask
+
+
+def project_payoff(db: Session, from_ym: str, n_months: int = DEFAULT_HORIZON) -> dict:
+    """
+    Month totals and per-account payoff months for n_months from from_ym.
+    payoff_ym is the month of the final deduction; None if the balance is
+    still outstanding at the end of the horizon.
+    """
+    y, m = int(from_ym[:4]), int(from_ym[5:7]) - 1 + n_months - 1
+    months = month_range(from_ym, f"{y + m // 12:04d}-{m % 12 + 1:02d}")
+    emp_nos, opening, installment, added, fixed, fixed_mask = _load(db, months)
+    out = payoff_kernel(opening, installment, added, fixed, fixed_mask)
+
+    deductions, balance, payoff = out["deductions"], out["balance"], out["payoff"]
+    totals = [
+        {
+            "ym": ym,
+            "advances": round(float(added[:, j].sum()), 2),
+            "deductions": round(float(deductions[:, j].sum()), 2),
+            "outstanding": round(float(np.maximum(balance[:, j], 0.0).sum()), 2),
+            "accounts_paying": int((deductions[:, j] > CENTS).sum()),
+        }
+        for j, ym in enumerate(months)
+    ]
+    accounts = [
+        {
+            "emp_no": emp_no,
+            "opening": round(float(opening[i]), 2),
+            "monthly_installment": round(float(installment[i]), 2),
+            "payoff_ym": months[payoff[i]] if payoff[i] >= 0 else None,
+            "balance_at_end": round(float(balance[i, -1]), 2),
+        }
+        for i, emp_no in enumerate(emp_nos)
+    ]
+    unresolved = int((payoff < 0).sum())
+    cleared_by = None
+    if not unresolved:
+        cleared_by = months[int(payoff.max())] if accounts else months[0]
+    return {
+        "from_ym": months[0],
+        "to_ym": months[-1],
+        "months": totals,
+        "accounts": accounts,
+        "outstanding_at_end": unresolved,
+        "all_cleared_by": cleared_by,
+    }
@@ -0,0 +1,146 @@
+# refdata.py
+import hashlib
+import sys
+import threading
+import time
+from collections import namedtuple
+from typing import Dict
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from fast_json import dumps, etag_matches
+from models import Employee, Trade
+from versions import EMPLOYEES, TRADES, bump_versions, current_versions
+
+# Seconds a worker trusts its copy before re-reading the version row
+CHECK_INTERVAL = 2.0
+
+# Pay columns pre-converted to float (None -> 0.0)
+EmployeeRef = namedtuple("EmployeeRef", [
+    "emp_no", "name", "DOJ", "base_pay", "food_all", "ws_allowance", "hra", "spl_allown", "fixed_ot", "OT",
+])
+
+_EMPLOYEE_API_FIELDS = ["emp_no", "name", "DOJ", "base_pay", "Food_All", "WS_Allowance", "HRA", "SPL_Allown", "Fixed_OT", "OT"]
+
+
+def _load_employees(db: Session):
+    rows = db.query(*(getattr(Employee, f) for f in _EMPLOYEE_API_FIELDS)).order_by(Employee.emp_no).all()
+    data = {
+        r.emp_no: EmployeeRef(r.emp_no, r.name, r.DOJ, *(float(v or 0) for v in r[3:9]), r.OT)
+        for r in rows
+    }
+    # API body keeps the DECIMAL columns as EmployeeOut renders them
+    return data, dumps([dict(zip(_EMPLOYEE_API_FIELDS, r)) for r in rows])
+
+
+def _load_trades(db: Session):
+    rows = db.query(Trade.id, Trade.trade_name).order_by(Trade.id).all()
+    return {r.id: r.trade_name for r in rows}, dumps([{"id": r.id, "trade_name": r.trade_name} for r in rows])
+
+
+class _RefTable:
+    """
+    One worker's copy of a reference table, its encoded API body and ETag.
+    Reloaded when the table's row in ref_data_versions moves.
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self.loader = loader
+        self.version = None
+        self.data = None
+        self.body = b""
+        self.etag = ""
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def mark_stale(self):
+        self.checked_at = 0.0
+
+    def get(self, db: Session) -> "_RefTable":
+        now = time.monotonic()
+        if self.data is not None and now - self.checked_at < CHECK_INTERVAL:
+            return self
+        with self._lock:
+            if self.data is not None and now - self.checked_at < CHECK_INTERVAL:
+                return self
+            version = current_versions(db, [self.name])[self.name]
+            if self.data is None or version != self.version:
+                self.data, self.body = self.loader(db)
+                self.etag = f'"{self.name}-{version}-{hashlib.blake2b(self.body, digest_size=8).hexdigest()}"'
+                self.version = version
+            self.checked_at = now
+        return self
+
+
+_tables = {EMPLOYEES: _RefTable(EMPLOYEES, _load_employees), TRADES: _RefTable(TRADES, _load_trades)}
+_MODEL_TABLES = {Employee: EMPLOYEES, Trade: TRADES}
+
+
+def sync(versions: Dict[str, int]):
+    """
+    Reload on next use any table whose copy is not at the given version, e.g.
+    the versions a cached report is about to be computed at.
+    """
+    for name, version in versions.items():
+        table = _tables.get(name)
+        if table is not None and table.version != version:
+            table.mark_stale()
+
+
+def employees(db: Session) -> Dict[str, EmployeeRef]:
+    return _tables[EMPLOYEES].get(db).data
+
+
+def trades(db: Session) -> Dict[int, str]:
+    return _tables[TRADES].get(db).data
+
+
+def ref_response(request: Request, db: Session, name: str) -> Response:
+    """
+    Encoded reference table with an ETag; 304 when the client's copy is current.
+    """
+    table = _tables[name].get(db)
+    headers = {"ETag": table.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, table.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=table.body, media_type="application/json", headers=headers)
+
+
+# ---- ORM writes to employees/trades bump the version in the same transaction ----
+
+@event.listens_for(Session, "after_flush")
+def _bump_after_flush(session: Session, flush_context):
+    names = {
+        _MODEL_TABLES[type(obj)]
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if type(obj) in _MODEL_TABLES
+    }
+    if not names:
+        return
+    touched = session.info.setdefault("ref_data_touched", set())
+    # Once per transaction per table is enough for other workers to notice
+    bump_versions(session, names - touched)
+    touched.update(names)
+
+
+@event.listens_for(Session, "after_commit")
+def _reload_after_commit(session: Session):
+    for name in session.info.pop("ref_data_touched", ()):
+        _tables[name].mark_stale()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session: Session):
+    session.info.pop("ref_data_touched", None)
+
+
+if __name__ == "__main__":
+    # After editing employees/trades directly in SQL: python refdata.py employees trades
+    db = SessionLocal()
+    try:
+        bump_versions(db, sys.argv[1:] or [EMPLOYEES, TRADES])
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,175 @@
+# report_cache.py
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Iterable, List, Optional, Tuple
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import refdata
+from fast_json import dumps, etag_matches
+from versions import bump_versions, current_versions
+
+# Cache kinds: which table family a cached report is computed from
+TIMESHEETS = "timesheets"
+ATTENDANCE = "attendance"
+
+MAX_ENTRIES = 256
+MAX_BYTES = 64 * 1024 * 1024
+
+# Validity is shared across workers through counters in ref_data_versions
+# (see versions.py). A report depends on its kind's counter, one per month
+# its range covers or one for its job_no, and the employees/trades counters.
+# Writes bump the counters for what they touched in the same transaction;
+# every hit re-reads them, so no worker serves (or 304s) a stale body.
+
+
+def _job_scope(kind: str, job_no: str) -> str:
+    # job_no is up to 50 chars; a digest keeps the name within the column
+    return f"{kind}:job:{hashlib.blake2b(job_no.encode(), digest_size=8).hexdigest()}"
+
+
+def _month_scopes(kind: str, start: date, end: date) -> List[str]:
+    names = []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        names.append(f"{kind}:{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return names
+
+
+def _scopes(kind: str, start: Optional[date], end: Optional[date], job_no: Optional[str]) -> List[str]:
+    if job_no is not None:
+        scoped = [_job_scope(kind, job_no)]
+    elif start is not None and end is not None:
+        scoped = _month_scopes(kind, start, end)
+    else:
+        raise ValueError("cached reports need a start and end date or a job_no")
+    return [kind, refdata.EMPLOYEES, refdata.TRADES, *scoped]
+
+
+class _Entry:
+    __slots__ = ("body", "etag", "stamp")
+
+    def __init__(self, body: bytes, stamp: tuple):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.stamp = stamp
+
+
+class ReportCache:
+    """
+    Per-process LRU cache of encoded report bodies, bounded by entry count and
+    total bytes. Each entry carries the counter versions it was computed at;
+    an entry whose versions have moved is recomputed in place.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: _Entry) -> _Entry:
+        with self._lock:
+            if len(entry.body) > self.max_bytes:
+                return entry
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+report_cache = ReportCache()
+
+
+# ---- write tracking: writes record what they touched on the session, commit bumps the counters ----
+
+def _touch(db: Session, names: Iterable[str]):
+    db.info.setdefault("report_cache_touched", set()).update(names)
+
+
+def touch_timesheet_days(db: Session, keys: Iterable[Tuple[str, date, str]]):
+    """
+    Record (emp_no, date, job_no) keys written in this transaction.
+    """
+    names = set()
+    for _, d, job_no in keys:
+        names.add(f"{TIMESHEETS}:{d:%Y-%m}")
+        names.add(_job_scope(TIMESHEETS, job_no or ""))
+    _touch(db, names)
+
+
+def touch_attendance_dates(db: Session, dates: Iterable[date]):
+    _touch(db, {f"{ATTENDANCE}:{d:%Y-%m}" for d in dates})
+
+
+def touch_all(db: Session, kind: str):
+    """
+    Every report of this kind, e.g. after a rollup rebuild.
+    """
+    _touch(db, [kind])
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_before_commit(session: Session):
+    touched = session.info.pop("report_cache_touched", None)
+    if touched:
+        bump_versions(session, touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session: Session):
+    session.info.pop("report_cache_touched", None)
+
+
+# ---- responses ----
+
+def cached_json(
+    request: Request,
+    db: Session,
+    key: tuple,
+    compute: Callable[[], object],
+    kind: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    job_no: Optional[str] = None,
+) -> Response:
+    """
+    Serve a report from the cache (computing and storing it on a miss or when
+    its counters have moved) with an ETag; answers 304 with no body when the
+    client already has this version.
+    """
+    versions = current_versions(db, _scopes(kind, start, end, job_no))
+    stamp = tuple(sorted(versions.items()))
+    entry = report_cache.get(key)
+    if entry is None or entry.stamp != stamp:
+        # Computed in the same transaction the counters were read in, against
+        # employees/trades at the versions in the stamp
+        refdata.sync(versions)
+        body = dumps(compute(), decimal_as_float=True)
+        entry = report_cache.put(key, _Entry(body, stamp))
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
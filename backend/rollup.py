@@ -0,0 +1,120 @@
+# rollup.py
+import sys
+from datetime import date
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import DailyHours, Timesheet, TimesheetEntry
+from report_cache import TIMESHEETS, touch_all, touch_timesheet_days
+
+DailyKey = Tuple[str, date, str]  # (emp_no, date, job_no)
+
+ROLLUP_COLUMNS = ["emp_no", "date", "job_no", "hours", "entry_count", "timesheet_ids"]
+
+
+def _aggregate_select():
+    """
+    SELECT emp_no, date, job_no, hours, entry_count, timesheet_ids from the raw tables,
+    in the column order of DailyHours.
+    """
+    job_no = func.coalesce(Timesheet.job_no, "")
+    return (
+        select(
+            TimesheetEntry.employee_emp_no,
+            Timesheet.date,
+            job_no,
+            func.coalesce(func.sum(TimesheetEntry.total_hours), 0),
+            func.count(TimesheetEntry.id),
+            func.group_concat(TimesheetEntry.timesheet_id.distinct()),
+        )
+        .join(Timesheet, Timesheet.id == TimesheetEntry.timesheet_id)
+        .group_by(TimesheetEntry.employee_emp_no, Timesheet.date, job_no)
+    )
+
+
+def daily_key(emp_no: str, d: date, job_no: Optional[str]) -> DailyKey:
+    return (emp_no, d, job_no or "")
+
+
+def refresh_daily_hours(db: Session, keys: Iterable[DailyKey]) -> int:
+    """
+    Recompute the rollup rows for exactly these (emp_no, date, job_no) keys from
+    timesheet_entries, inside the caller's transaction. Pending ORM changes are
+    flushed first so the recompute sees them.
+    """
+    keys = {daily_key(*k) for k in keys}
+    if not keys:
+        return 0
+    db.flush()
+
+    emp_nos = {k[0] for k in keys}
+    dates = {k[1] for k in keys}
+    rows = db.execute(
+        _aggregate_select().where(
+            TimesheetEntry.employee_emp_no.in_(emp_nos),
+            Timesheet.date.in_(dates),
+        )
+    ).all()
+    fresh = [dict(zip(ROLLUP_COLUMNS, r)) for r in rows if (r[0], r[1], r[2]) in keys]
+
+    db.query(DailyHours).filter(
+        tuple_(DailyHours.emp_no, DailyHours.date, DailyHours.job_no).in_(list(keys))
+    ).delete(synchronize_session=False)
+    if fresh:
+        db.execute(insert(DailyHours), fresh)
+    touch_timesheet_days(db, keys)
+    return len(fresh)
+
+
+def sheet_keys(db: Session, timesheet_id: int) -> set:
+    """
+    Rollup keys currently covered by one timesheet.
+    """
+    rows = (
+        db.query(TimesheetEntry.employee_emp_no, Timesheet.date, Timesheet.job_no)
+        .join(Timesheet, Timesheet.id == TimesheetEntry.timesheet_id)
+        .filter(Timesheet.id == timesheet_id)
+        .distinct()
+        .all()
+    )
+    return {daily_key(*r) for r in rows}
+
+
+def rebuild_daily_hours(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Backfill: drop and regenerate the rollup (optionally only for a date range)
+    with one INSERT ... SELECT. Commits.
+    """
+    delete_q = db.query(DailyHours)
+    sel = _aggregate_select()
+    if start:
+        delete_q = delete_q.filter(DailyHours.date >= start)
+        sel = sel.where(Timesheet.date >= start)
+    if end:
+        delete_q = delete_q.filter(DailyHours.date <= end)
+        sel = sel.where(Timesheet.date <= end)
+
+    delete_q.delete(synchronize_session=False)
+    result = db.execute(insert(DailyHours).from_select(ROLLUP_COLUMNS, sel))
+    touch_all(db, TIMESHEETS)
+    db.commit()
+    return result.rowcount
+
+
+def rollup_needs_backfill(db: Session) -> bool:
+    """
+    True when there are entries but the rollup has never been built.
+    """
+    return db.query(DailyHours.emp_no).first() is None and db.query(TimesheetEntry.id).first() is not None
+
+
+if __name__ == "__main__":
+    # python rollup.py [start] [end]   (dates as YYYY-MM-DD)
+    args = [date.fromisoformat(a) for a in sys.argv[1:3]]
+    session = SessionLocal()
+    try:
+        count = rebuild_daily_hours(session, *args)
+        print(f"[Rollup] daily_hours rebuilt: {count} rows")
+    finally:
+        session.close()
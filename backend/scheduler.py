@@ -2,62 +2,24 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
 from datetime import date
-from decimal import Decimal
 from database import SessionLocal
-from models import AdvanceAccount, AdvanceTxn, AdvanceType
+from advance_ops import run_auto_deductions
 
 scheduler = BackgroundScheduler()
 
-def run_monthly_auto_deductions() -> int:
+def run_monthly_auto_deductions() -> dict:
     """
-    Go through all employees with advances > 0
-    and insert a PAYMENT transaction for the current month,
-    ensuring we never deduct more than the remaining balance.
+    Insert this month's PAYMENT for every account with a balance, never
+    deducting more than the remaining balance. Safe to re-run; returns the run report.
     """
     db: Session = SessionLocal()
-    inserted_count = 0
     try:
-        today = date.today()
-        ym_str = today.strftime("%Y-%m")
-
-        # Get all accounts with a positive balance
-        accounts = db.query(AdvanceAccount).filter(AdvanceAccount.advance > 0).all()
-
-        for acc in accounts:
-            # Check if payment for this month already exists
-            existing = db.query(AdvanceTxn).filter(
-                AdvanceTxn.emp_no == acc.emp_no,
-                AdvanceTxn.ym == ym_str,
-                AdvanceTxn.type == AdvanceType.PAYMENT
-            ).first()
-
-            if existing:
-                continue  # Skip if already paid/deducted
-
-            balance_now = Decimal(str(acc.advance))
-            installment = Decimal(str(acc.monthly_installment or 0))
-
-            if balance_now <= 0 or installment <= 0:
-                continue
-
-            # Never deduct more than balance
-            payment_amount = -float(min(balance_now, installment))
-
-            txn = AdvanceTxn(
-                emp_no=acc.emp_no,
-                ts=today,
-                type=AdvanceType.PAYMENT,
-                amount=payment_amount,
-                note="Auto monthly deduction"
-            )
-            db.add(txn)
-            inserted_count += 1
-
-        db.commit()
+        report = run_auto_deductions(db, date.today())
     finally:
         db.close()
-
-    return inserted_count
+    print(f"[Scheduler] Auto deductions {report['ym']}: {report['inserted']} inserted, "
+          f"{report['failed_chunks']} failed chunk(s), {report['duration_ms']} ms")
+    return report
 
 
 def start_scheduler():
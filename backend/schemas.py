@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Annotated, Literal
+from typing import List, Optional, Annotated, Literal, Union
 from decimal import Decimal
 from datetime import date, time
 
@@ -63,22 +63,31 @@ class TimesheetEntryOut(BaseModel):
         "from_attributes": True  # Pydantic v2
     }
 
-# Output model for a full timesheet
-class TimesheetOut(BaseModel):
+# Output model for a timesheet header (list views)
+class TimesheetHeaderOut(BaseModel):
     id: int
     job_no: str
     site: str
     ship: str
+    sheet_no: Optional[str] = None
     checked_by: str
     authorized_by: str
     for_company: str
     date: date
-    entries: List[TimesheetEntryOut]
 
     model_config = {
         "from_attributes": True
     }
 
+# Output model for a full timesheet
+class TimesheetOut(TimesheetHeaderOut):
+    entries: List[TimesheetEntryOut]
+
+# One keyset page of GET /timesheets; pass next_cursor back as ?cursor= for the next page
+class TimesheetPageOut(BaseModel):
+    items: List[Union[TimesheetOut, TimesheetHeaderOut]]
+    next_cursor: Optional[str] = None
+
 # Partial update model for a timesheet entry
 class TimesheetEntryUpdate(BaseModel):
     employee_emp_no: Optional[str] = None
@@ -117,6 +126,13 @@ class AttendanceBulkIn(BaseModel):
     date: date
     records: List[AttendanceItemIn]
 
+# Records for many dates in one call (e.g. back-filling a month)
+class AttendanceDatedItemIn(AttendanceItemIn):
+    att_date: date
+
+class AttendanceMultiBulkIn(BaseModel):
+    records: List[AttendanceDatedItemIn]
+
 class AttendanceItemOut(BaseModel):
     emp_no: str
     att_date: date
@@ -185,4 +201,26 @@ class InstallmentUpdateOut(BaseModel):
 class BalanceOut(BaseModel):
     emp_no: str
     balance: float
-    monthly_installment: Optional[float] = 0.0
\ No newline at end of file
+    monthly_installment: Optional[float] = 0.0
+# One flattened row of a bulk timesheet import (sheet header + one entry)
+class TimesheetImportRow(TimesheetEntryIn):
+    date: date
+    job_no: str
+    ship: str
+    site: str
+    sheet_no: str
+    checked_by: str
+    authorized_by: str
+    for_company: str
+
+class ImportRowError(BaseModel):
+    row: int
+    detail: str
+
+class ImportReportOut(BaseModel):
+    message: str
+    rows_read: int
+    entries_inserted: int
+    timesheets_created: int
+    committed: bool
+    errors: List[ImportRowError]
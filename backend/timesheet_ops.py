@@ -0,0 +1,151 @@
+# timesheet_ops.py
+from datetime import date, time
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from models import Timesheet, TimesheetEntry
+import refdata
+
+MAX_DAY_HOURS = Decimal("24")
+
+ENTRY_COLUMNS = (
+    "timesheet_id", "employee_emp_no", "trade_id", "from_time", "to_time",
+    "break_minutes", "total_hours", "remarks",
+)
+
+
+def existing_emp_nos(db: Session, emp_nos: Iterable[str]) -> Dict[str, str]:
+    """
+    emp_no -> name for the given employee numbers, from the reference-data cache.
+    """
+    known = refdata.employees(db)
+    return {e: known[e].name for e in set(emp_nos) if e in known}
+
+
+def existing_trade_ids(db: Session, trade_ids: Iterable[int]) -> set:
+    known = refdata.trades(db)
+    return {t for t in trade_ids if t is not None and t in known}
+
+
+def load_day_totals(db: Session, keys: Iterable[Tuple[date, str]]) -> Dict[Tuple[date, str], Decimal]:
+    """
+    Logged hours per (date, emp_no) for every key, in one grouped query.
+    Keys with no hours are absent from the result.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    dates = {d for d, _ in keys}
+    emp_nos = {e for _, e in keys}
+
+    rows = (
+        db.query(
+            Timesheet.date,
+            TimesheetEntry.employee_emp_no,
+            func.coalesce(func.sum(TimesheetEntry.total_hours), 0),
+        )
+        .join(Timesheet, Timesheet.id == TimesheetEntry.timesheet_id)
+        .filter(Timesheet.date.in_(dates), TimesheetEntry.employee_emp_no.in_(emp_nos))
+        .group_by(Timesheet.date, TimesheetEntry.employee_emp_no)
+        .all()
+    )
+    # The IN lists select a superset (dates x emp_nos); keep only requested pairs
+    return {
+        (d, emp_no): Decimal(str(total))
+        for d, emp_no, total in rows
+        if (d, emp_no) in keys
+    }
+
+
+def add_day_hours(totals: Dict[Tuple[date, str], Decimal], parts: Iterable[Tuple[date, str, float]]):
+    """
+    Adds each (date, emp_no, hours) part to the running totals, all or nothing.
+    Returns the first (date, emp_no) that would exceed 24 hours (totals untouched),
+    or None once every part has been added.
+    """
+    parts = list(parts)
+    staged = {}
+    for d, emp_no, hours in parts:
+        key = (d, emp_no)
+        running = staged.get(key, totals.get(key, Decimal("0"))) + Decimal(str(hours))
+        if running > MAX_DAY_HOURS:
+            return key
+        staged[key] = running
+    totals.update(staged)
+    return None
+
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def _seconds(t: time) -> int:
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def split_overnight(from_time: time, to_time: time, break_minutes: int):
+    """
+    Split an entry crossing midnight into (part1, part2) field dicts.
+    Part 1 is counted up to midnight (stored as 23:59, since TIME has no 24:00)
+    and carries the break; a break longer than Part 1 spills into Part 2.
+    The two parts always add up to the whole shift.
+    """
+    part1_s = DAY_SECONDS - _seconds(from_time)
+    part2_s = _seconds(to_time)
+    break_s = (break_minutes or 0) * 60
+    break1_s = min(break_s, part1_s)
+    break2_s = min(break_s - break1_s, part2_s)
+
+    total_hours = round((part1_s + part2_s - break1_s - break2_s) / 3600, 2)
+    first_hours = round((part1_s - break1_s) / 3600, 2)
+
+    part1 = {
+        "from_time": from_time,
+        "to_time": time(23, 59),
+        "break_minutes": break1_s // 60,
+        "total_hours": first_hours,
+    }
+    part2 = {
+        "from_time": time(0, 0),
+        "to_time": to_time,
+        "break_minutes": break2_s // 60,
+        "total_hours": round(total_hours - first_hours, 2),
+    }
+    return part1, part2
+
+
+def split_entry(entry, sheet_no: str) -> List[Tuple[int, dict]]:
+    """
+    Turns one incoming entry into [(day_offset, entry fields), ...]:
+    a single fragment on the sheet's own day (offset 0), or for an overnight
+    shift a Part 1 fragment on day 0 and a Part 2 fragment on day 1.
+    A part with no hours (a shift ending at 00:00, or a break covering all of
+    Part 1) is dropped, so no next-day sheet is made for an empty Part 2.
+    """
+    base = {"employee_emp_no": entry.employee_emp_no, "trade_id": entry.trade_id}
+    if entry.from_time > entry.to_time:
+        part1, part2 = split_overnight(entry.from_time, entry.to_time, entry.break_minutes)
+        parts = [
+            (0, {**base, **part1, "remarks": "Split overnight entry (Part 1)"}),
+            (1, {**base, **part2, "remarks": f"Split overnight entry (Part 2 from timesheet {sheet_no})"}),
+        ]
+        # A fully-break shift still leaves one (0 h) row on its own day
+        return [p for p in parts if p[1]["total_hours"] > 0] or parts[:1]
+    return [(0, {
+        **base,
+        "from_time": entry.from_time,
+        "to_time": entry.to_time,
+        "break_minutes": entry.break_minutes,
+        "total_hours": entry.total_hours,
+        "remarks": entry.remarks,
+    })]
+
+
+def bulk_insert_entries(db: Session, rows: List[dict]) -> int:
+    """
+    Multi-row INSERT of timesheet entries (executemany) inside the caller's transaction.
+    """
+    if not rows:
+        return 0
+    db.execute(insert(TimesheetEntry), [{k: r.get(k) for k in ENTRY_COLUMNS} for r in rows])
+    return len(rows)
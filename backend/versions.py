@@ -0,0 +1,38 @@
+# versions.py
+from typing import Dict, Iterable
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import Session
+from models import RefDataVersion
+
+# Shared change counters in ref_data_versions, the one invalidation signal
+# every worker can see: a writer bumps the rows for what it changed in its
+# own transaction, and per-worker caches compare the versions they were built
+# at against the current rows before serving.
+
+# Reference tables with a counter; reports built from them depend on these too
+EMPLOYEES = "employees"
+TRADES = "trades"
+
+
+def bump_versions(db: Session, names: Iterable[str]):
+    """
+    Increment (creating at 1) each counter, inside the caller's transaction.
+    Sorted, so concurrent writers lock the rows in the same order.
+    """
+    names = sorted(set(names))
+    if names:
+        stmt = insert(RefDataVersion).values([{"name": n, "version": 1} for n in names])
+        db.execute(stmt.on_duplicate_key_update(version=RefDataVersion.version + 1))
+
+
+def current_versions(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    """
+    {name: version} for names, 0 for counters never bumped.
+    """
+    names = set(names)
+    found = dict(
+        db.query(RefDataVersion.name, RefDataVersion.version)
+        .filter(RefDataVersion.name.in_(names))
+        .all()
+    ) if names else {}
+    return {n: found.get(n, 0) for n in names}
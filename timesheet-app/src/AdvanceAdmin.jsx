@@ -859,16 +859,22 @@ function AddAdvanceModal({ employees, defaultMonth, onClose, onCreate }) {
 function HistoryButton({ emp_no, balance, monthly_installment }) {
   const [open, setOpen] = useState(false);
   const [rows, setRows] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
 
-  const load = async () => {
+  // Paged batch history endpoint, 50 transactions at a time
+  const load = async (cursor = null) => {
     try {
       setLoading(true);
-      const r = await API(`/advances/${encodeURIComponent(emp_no)}/history`);
+      const params = new URLSearchParams({ emp_no, limit: "50" });
+      if (cursor) params.append("cursor", cursor);
+      const r = await API(`/advances/history?${params}`);
       if (!r.ok) throw new Error();
-      setRows(await r.json());
+      const group = (await r.json()).groups.find((g) => g.emp_no === emp_no);
+      setRows((prev) => (cursor ? [...(prev || []), ...(group?.items || [])] : group?.items || []));
+      setNextCursor(group?.next_cursor || null);
     } catch {
-      setRows([]);
+      if (!cursor) setRows([]);
     } finally {
       setLoading(false);
     }
@@ -943,6 +949,11 @@ function HistoryButton({ emp_no, balance, monthly_installment }) {
                     ))}
                   </tbody>
                 </table>
+                {nextCursor && (
+                  <button className="btn btn-sm btn-outline-secondary" onClick={() => load(nextCursor)}>
+                    Load more
+                  </button>
+                )}
               </div>
             ) : (
               <em className="text-muted">No transactions.</em>
@@ -40,13 +40,27 @@ export default function AttendanceViewer() {
       .catch(() => setError("Failed to load employees"));
   }, []);
 
+  // One request for the whole range: a status-code string per employee
   const fetchRangeFast = async () => {
-    const url = `http://127.0.0.1:8000/attendance/range?start=${toApi(
+    const url = `http://127.0.0.1:8000/attendance/grid?start=${toApi(
       start
     )}&end=${toApi(end)}`;
     const r = await fetch(url);
-    if (!r.ok) throw new Error("no-range-endpoint");
-    return r.json();
+    if (!r.ok) throw new Error("no-grid-endpoint");
+    const grid = await r.json();
+    const gridStart = new Date(`${grid.start}T00:00:00`);
+    const rows = [];
+    Object.entries(grid.rows).forEach(([emp_no, codes]) => {
+      for (let i = 0; i < codes.length; i++) {
+        if (codes[i] === "0") continue;
+        rows.push({
+          emp_no,
+          date: toApi(addDays(gridStart, i)),
+          status: grid.legend[grid.codes.indexOf(codes[i])]
+        });
+      }
+    });
+    return rows;
   };
 
   const fetchRangeFallback = async () => {
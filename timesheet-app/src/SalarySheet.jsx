@@ -13,15 +13,13 @@ import JSZip from "jszip";
 import { saveAs } from "file-saver";
 
 export default function SalarySheet() {
+  // Finished salary rows computed by the backend (/payroll/salary-sheet)
   const [employees, setEmployees] = useState([]);
-  const [otHoursByEmp, setOtHoursByEmp] = useState({});
-  const [absencesByEmp, setAbsencesByEmp] = useState({});
   const [selectedMonth, setSelectedMonth] = useState(null);
   const [error, setError] = useState("");
   const [attendanceUpdatedAt, setAttendanceUpdatedAt] = useState(0);
   const [detailModal, setDetailModal] = useState({ show: false, emp: null, dates: [] });
 
-  const toApi = (d) => format(d, "yyyy-MM-dd");
   const daysInSelectedMonth = selectedMonth ? getDaysInMonth(selectedMonth) : getDaysInMonth(new Date());
   const { start: winStart, end: winEnd } = getOtWindow(selectedMonth || new Date());
 
@@ -59,20 +57,6 @@ export default function SalarySheet() {
     };
   }, []);
 
-  useEffect(() => {
-    fetch("http://127.0.0.1:8000/employees")
-      .then((res) => res.json())
-      .then((data) => {
-        const sorted = [...data].sort((a, b) => {
-          const na = parseInt(a.emp_no?.replace(/\D/g, ""), 10);
-          const nb = parseInt(b.emp_no?.replace(/\D/g, ""), 10);
-          return na - nb;
-        });
-        setEmployees(sorted);
-      })
-      .catch(() => setError("Error fetching employees"));
-  }, []);
-
   useEffect(() => {
     const stored = sessionStorage.getItem("salarySelectedMonth");
     if (stored) {
@@ -91,92 +75,24 @@ export default function SalarySheet() {
 
   useEffect(() => {
     if (!selectedMonth) return;
-    const { start, end } = getOtWindow(selectedMonth);
-    if (!start || !end) return;
-
-    const summaryUrl = `http://127.0.0.1:8000/reports/summary?start=${toApi(start)}&end=${toApi(end)}`;
-    const firstDay = new Date(selectedMonth.getFullYear(), selectedMonth.getMonth(), 1);
-    const lastDay = new Date(selectedMonth.getFullYear(), selectedMonth.getMonth() + 1, 0);
-    const absencesUrl = `http://127.0.0.1:8000/attendance/absences?start=${toApi(firstDay)}&end=${toApi(lastDay)}`;
-
-    Promise.all([fetch(summaryUrl), fetch(absencesUrl)])
-      .then(async ([otRes, absRes]) => {
-        if (!otRes.ok) throw new Error("OT fetch failed");
-        if (!absRes.ok) throw new Error("Absences fetch failed");
-        const otData = await otRes.json();
-        const absData = await absRes.json();
-
-        const otMap = {};
-        (otData || []).forEach((row) => {
-          otMap[row.emp_no] = {
-            hrs_not: parseFloat(row.normal_ot) || 0,
-            hrs_hot: parseFloat(row.holiday_ot) || 0,
-          };
-        });
-        setOtHoursByEmp(otMap);
-
-        const absMap = {};
-        (absData || []).forEach((row) => {
-          absMap[row.emp_no] = {
-            count: row.count || 0,
-            dates: row.dates || [],
-          };
-        });
-        setAbsencesByEmp(absMap);
+    const url = `http://127.0.0.1:8000/payroll/salary-sheet?month=${selectedMonth.getMonth() + 1}&year=${selectedMonth.getFullYear()}`;
 
+    fetch(url)
+      .then(async (res) => {
+        if (!res.ok) throw new Error("Salary sheet fetch failed");
+        const data = await res.json();
+        setEmployees(data.rows || []);
         setError("");
       })
       .catch((e) => {
         console.error(e);
-        setOtHoursByEmp({});
-        setAbsencesByEmp({});
-        setError("Failed to load OT/Absence data for selected window.");
+        setEmployees([]);
+        setError("Failed to load salary sheet for selected month.");
       });
   }, [selectedMonth, attendanceUpdatedAt]);
 
-  function calculateTotalSalary(emp) {
-    const parts = [
-      emp.base_pay,
-      emp.Food_All,
-      emp.WS_Allowance,
-      emp.HRA,
-      emp.SPL_Allown,
-      emp.Fixed_OT,
-    ];
-    return parts.reduce((sum, v) => sum + (parseFloat(v) || 0), 0);
-  }
-
-  function getNonSlAbsenceDays(emp) {
-    const dates = absencesByEmp[emp.emp_no]?.dates || [];
-    return dates.filter((d) => (String(d.status || "").trim().toUpperCase()) !== "ML").length;
-  }
-
-  function calculateBasicEarned(emp) {
-    const basic = parseFloat(emp.base_pay) || 0;
-    const nonSlAbs = getNonSlAbsenceDays(emp);
-    const presentDays = Math.max(0, daysInSelectedMonth - nonSlAbs);
-    return (basic / daysInSelectedMonth) * presentDays;
-  }
-
-  function calcAbsenceDeduction(emp) {
-    const basic = parseFloat(emp.base_pay) || 0;
-    const nonSlAbs = getNonSlAbsenceDays(emp);
-    return (basic / daysInSelectedMonth) * nonSlAbs;
-  }
-
-  function calcOtAmount(emp, hrs) {
-    const basic = parseFloat(emp.base_pay) || 0;
-    const hourlyBase = basic / 240;
-    const notRate = hourlyBase * 1.25;
-    const hotRate = hourlyBase * 1.5;
-    const notHrs = parseFloat(hrs?.hrs_not) || 0;
-    const hotHrs = parseFloat(hrs?.hrs_hot) || 0;
-    return notHrs * notRate + hotHrs * hotRate;
-  }
-
   function openDetailModal(emp) {
-    const info = absencesByEmp[emp.emp_no] || { dates: [] };
-    setDetailModal({ show: true, emp, dates: info.dates });
+    setDetailModal({ show: true, emp, dates: emp.absence_dates || [] });
   }
   const closeModal = () => setDetailModal({ show: false, emp: null, dates: [] });
 
@@ -218,53 +134,33 @@ export default function SalarySheet() {
   }
 
   function buildRowData(emp, idx) {
-    const hours = otHoursByEmp[emp.emp_no] || { hrs_not: 0, hrs_hot: 0 };
-    const notHotAmount = calcOtAmount(emp, hours);
-    const absenceAll = absencesByEmp[emp.emp_no]?.count ?? 0;
-    const nonSlAbs = getNonSlAbsenceDays(emp);
-    const absenceDeduction = calcAbsenceDeduction(emp);
-
     return {
       "S.no": idx + 1,
       "Roll No": emp.emp_no || "",
       "Name": emp.name || "",
       "DOJ": emp.DOJ || "",
-      "BASIC": parseFloat(emp.base_pay) || 0,
-      "Food All": parseFloat(emp.Food_All) || 0,
-      "W/S Allowance": parseFloat(emp.WS_Allowance) || 0,
-      "HRA": parseFloat(emp.HRA) || 0,
-      "SPL Allown": parseFloat(emp.SPL_Allown) || 0,
-      "Fixed OT": parseFloat(emp.Fixed_OT) || 0,
-      "TOTAL SALARY": calculateTotalSalary(emp),
-      "ABSENT/ AL/ EL": absenceAll,
-      "Absence Days (non-SL)": nonSlAbs,
-      "Absence Deduction": absenceDeduction,
-      "Basic Earned": calculateBasicEarned(emp),
-      "HRS/ NOT": parseFloat(hours.hrs_not) || 0,
-      "HRS/ HOT": parseFloat(hours.hrs_hot) || 0,
-      "NOT/HOT Amount": notHotAmount,
-      "EARNED SALARY": parseFloat(emp.earned_salary) || 0,
-      "5238 Tank Cleaning": parseFloat(emp.tank_cleaning) || 0,
-      "AT and other Payable": parseFloat(emp.at_other_payable) || 0,
-      "ALWN": parseFloat(emp.ALWN) || 0,
-      "GROSS SALARY": parseFloat(emp.gross_salary) || (
-        calculateBasicEarned(emp) +
-        (parseFloat(emp.Food_All) || 0) +
-        (parseFloat(emp.WS_Allowance) || 0) +
-        (parseFloat(emp.HRA) || 0) +
-        (parseFloat(emp.SPL_Allown) || 0) +
-        (parseFloat(emp.Fixed_OT) || 0) +
-        notHotAmount +
-        (parseFloat(emp.ALWN) || 0) +
-        (parseFloat(emp.at_other_payable) || 0) +
-        (parseFloat(emp.tank_cleaning) || 0)
-      ),
-      "5% CONTRIBUTION": parseFloat(emp.contrib_5) || 0,
-      "ADV": parseFloat(emp.ADV) || 0,
-      "R/Off": parseFloat(emp.R_Off) || 0,
-      "NET SALARY": parseFloat(emp.net_salary) || 0,
-      "OLD": parseFloat(emp.OLD) || 0,
-      "Incr/Decr": parseFloat(emp.incr_decr) || 0,
+      "BASIC": emp.basic,
+      "Food All": emp.food_all,
+      "W/S Allowance": emp.ws_allowance,
+      "HRA": emp.hra,
+      "SPL Allown": emp.spl_allown,
+      "Fixed OT": emp.fixed_ot,
+      "TOTAL SALARY": emp.total_salary,
+      "ABSENT/ AL/ EL": emp.absent_days,
+      "Absence Days (non-SL)": emp.deducted_absent_days,
+      "Absence Deduction": emp.absence_deduction,
+      "Basic Earned": emp.basic_earned,
+      "HRS/ NOT": emp.not_hours,
+      "HRS/ HOT": emp.hot_hours,
+      "NOT/HOT Amount": emp.ot_amount,
+      "5238 Tank Cleaning": 0,
+      "AT and other Payable": 0,
+      "ALWN": 0,
+      "GROSS SALARY": emp.gross_salary,
+      "5% CONTRIBUTION": 0,
+      "ADV": emp.adv,
+      "R/Off": 0,
+      "NET SALARY": emp.net_salary,
     };
   }
 
@@ -299,37 +195,34 @@ export default function SalarySheet() {
   }
 
   // ============== PDF generation (hide zero lines; show absence deduction as red negative in Earnings) ==============
-  const toNumber = (v) => (v ? parseFloat(v) || 0 : 0);
-
   function generatePayslipPdf(emp) {
     const doc = new jsPDF({ unit: "pt", format: "a4" });
     const marginX = 40;
 
     const monthLabel = selectedMonth ? format(selectedMonth, "MMMM yyyy") : "";
     const { start: ws, end: we } = getOtWindow(selectedMonth || new Date());
-    const hours = otHoursByEmp[emp.emp_no] || { hrs_not: 0, hrs_hot: 0 };
-    const notHotAmount = calcOtAmount(emp, hours);
-    const absenceAll = absencesByEmp[emp.emp_no]?.count ?? 0;
-
-    const basic = toNumber(emp.base_pay);
-    const basicEarned = calculateBasicEarned(emp);
-    const nonSlAbs = getNonSlAbsenceDays(emp);
-    const absenceDeduction = calcAbsenceDeduction(emp);
-
-    const food = toNumber(emp.Food_All);
-    const wsAll = toNumber(emp.WS_Allowance);
-    const hra = toNumber(emp.HRA);
-    const spl = toNumber(emp.SPL_Allown);
-    const fixedOt = toNumber(emp.Fixed_OT);
-    const alwn = toNumber(emp.ALWN);
-    const atOther = toNumber(emp.at_other_payable);
-    const tank = toNumber(emp.tank_cleaning);
-    const fivePct = toNumber(emp.contrib_5);
-    const adv = toNumber(emp.ADV);
-    const roff = toNumber(emp.R_Off);
-
-    const gross = toNumber(emp.gross_salary) || (basicEarned + food + wsAll + hra + spl + fixedOt + notHotAmount + alwn + atOther + tank);
-    const net = toNumber(emp.net_salary) || (gross - fivePct + adv + roff);
+    const hours = { hrs_not: emp.not_hours, hrs_hot: emp.hot_hours };
+    const notHotAmount = emp.ot_amount;
+    const absenceAll = emp.absent_days;
+
+    const basic = emp.basic;
+    const nonSlAbs = emp.deducted_absent_days;
+    const absenceDeduction = emp.absence_deduction;
+
+    const food = emp.food_all;
+    const wsAll = emp.ws_allowance;
+    const hra = emp.hra;
+    const spl = emp.spl_allown;
+    const fixedOt = emp.fixed_ot;
+    const alwn = 0;
+    const atOther = 0;
+    const tank = 0;
+    const fivePct = 0;
+    const adv = emp.adv;
+    const roff = 0;
+
+    const gross = emp.gross_salary;
+    const net = emp.net_salary;
 
     // Header
     doc.setFontSize(16);
@@ -4,15 +4,20 @@ import axios from "axios";
 
 const TimesheetManager = () => {
   const [timesheets, setTimesheets] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const navigate = useNavigate();
 
   useEffect(() => {
     fetchTimesheets();
   }, []);
 
-  const fetchTimesheets = async () => {
-    const res = await axios.get("http://localhost:8000/timesheets");
-    setTimesheets(res.data);
+  // Headers only, one page at a time; details are loaded when a sheet is opened
+  const fetchTimesheets = async (cursor = null) => {
+    const params = { headers_only: true, limit: 100 };
+    if (cursor) params.cursor = cursor;
+    const res = await axios.get("http://localhost:8000/timesheets", { params });
+    setTimesheets((prev) => (cursor ? [...prev, ...res.data.items] : res.data.items));
+    setNextCursor(res.data.next_cursor);
   };
 
   return (
@@ -50,6 +55,11 @@ const TimesheetManager = () => {
             ))}
           </tbody>
         </table>
+        {nextCursor && (
+          <button className="btn btn-outline-secondary btn-sm" onClick={() => fetchTimesheets(nextCursor)}>
+            Load more
+          </button>
+        )}
       </div>
     </div>
   );